@@ -0,0 +1,71 @@
+import time
+from collections import OrderedDict
+from copy import copy
+from threading import Lock
+
+from django.conf import settings
+from rest_framework.authentication import TokenAuthentication
+
+from recipe.versions import AUTH_VERSION_NAME, get_version
+
+
+class TokenCache:
+    '''
+    The users of the recently used tokens kept in the memory of the worker
+    for a while, the entries of an older authentication version are stale.
+    '''
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key, version):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            entry_version, expires, user, token = entry
+            if entry_version != version or expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return user, token
+
+    def set(self, key, version, user, token):
+        with self.lock:
+            self.entries[key] = (
+                version,
+                time.monotonic() + settings.AUTH_TOKEN_CACHE_TIMEOUT,
+                user, token
+            )
+            self.entries.move_to_end(key)
+            while len(self.entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''
+    The token authentication reading the user of the token from the cache
+    of the worker, the logout and the changes of the users change the
+    authentication version and make the workers read the tokens again.
+    '''
+
+    def authenticate_credentials(self, key):
+        # The version is read before the token, a change made meanwhile
+        # leaves the stored entry stale.
+        version = get_version(AUTH_VERSION_NAME)
+        cached = token_cache.get(key, version)
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, version, user, token)
+        else:
+            user, token = cached
+        # The requests change the attributes of their user.
+        return copy(user), token
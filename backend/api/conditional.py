@@ -0,0 +1,71 @@
+import hashlib
+import time
+
+from django.utils.cache import (
+    get_conditional_response, patch_vary_headers, quote_etag
+)
+from django.utils.http import http_date
+
+from recipe.versions import get_user_version_name, get_version
+
+
+class ConditionalMixin:
+    '''
+    Answer the conditional requests of the list and the detail
+    with the versions of the shown tables before serializing,
+    the ETag changes with any change of the tables.
+    '''
+
+    version_names = ()
+    # The responses contain the flags of the current user.
+    user_versioned = False
+
+    def get_version_names(self):
+        names = list(self.version_names)
+        user = self.request.user
+        if self.user_versioned and user.is_authenticated:
+            names.append(get_user_version_name(user.pk))
+        return names
+
+    def get_validators(self):
+        versions = [get_version(name) for name in self.get_version_names()]
+        user = self.request.user
+        etag = quote_etag(hashlib.md5(' '.join(map(str, (
+            self.basename,
+            self.action,
+            self.request.accepted_renderer.format,
+            user.pk if self.user_versioned and user.is_authenticated else '',
+            *versions,
+        ))).encode()).hexdigest())
+        # The date of the header is rounded up to the second, it is given
+        # only when the second has passed: a change later in the same
+        # second would have the same date.
+        last_modified = -(-max(versions) // 10 ** 9)
+        if last_modified > time.time():
+            last_modified = None
+        return etag, last_modified
+
+    def set_validators(self, response, etag, last_modified):
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        vary = ['Accept']
+        if self.user_versioned:
+            vary.append('Authorization')
+        patch_vary_headers(response, vary)
+        return response
+
+    def conditional(self, view, request, *args, **kwargs):
+        etag, last_modified = self.get_validators()
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = view(request, *args, **kwargs)
+        return self.set_validators(response, etag, last_modified)
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
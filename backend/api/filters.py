@@ -1,18 +1,78 @@
+from django.conf import settings
+from django.db.models import Case, Exists, IntegerField, OuterRef, Value, When
+from django.forms import IntegerField as IntegerFormField
 from django.forms.widgets import NullBooleanSelect
-from django_filters import BooleanFilter, CharFilter, ModelMultipleChoiceFilter
+from django_filters import (
+    BooleanFilter, CharFilter, ChoiceFilter, MultipleChoiceFilter,
+    NumberFilter
+)
 from django_filters.rest_framework import FilterSet
 
+from recipe.catalog import tag_catalog
 from recipe.models import Ingredient, Tag, Recipe
 
+SEARCH_MODE_PREFIX = 'prefix'
+SEARCH_MODE_RANKED = 'ranked'
+SEARCH_MODES = (
+    (SEARCH_MODE_PREFIX, 'Начало названия'),
+    (SEARCH_MODE_RANKED, 'Начало, затем любая часть названия'),
+)
+
+TAGS_MATCH_ANY = 'any'
+TAGS_MATCH_ALL = 'all'
+TAGS_MATCHES = (
+    (TAGS_MATCH_ANY, 'Любой из тэгов'),
+    (TAGS_MATCH_ALL, 'Все тэги'),
+)
+
+
+def get_tags():
+    if settings.CATALOG_CACHE_ENABLED:
+        return tag_catalog.all()
+    return Tag.objects.all()
+
+
+def get_tag_choices():
+    return [(tag.slug, tag.name) for tag in get_tags()]
+
+
+def skip_filtration(queryset, key, value):
+    '''The options of the other filters do not filter by themselves.'''
+    return queryset
+
+
+class IntegerFilter(NumberFilter):
+    field_class = IntegerFormField
+
 
 class ProductFilter(FilterSet):
-    '''Filter for products.'''
+    '''
+    Filter for products.
+    The ranked mode returns the products whose name starts with
+    the searched text first, followed by the ones containing it.
+    '''
 
-    name = CharFilter(lookup_expr='istartswith')
+    name = CharFilter(method='get_name')
+    mode = ChoiceFilter(choices=SEARCH_MODES, method=skip_filtration)
+    limit = IntegerFilter(min_value=1, method='get_limit')
 
     class Meta:
         model = Ingredient
-        fields = ['name']
+        fields = ['name', 'mode', 'limit']
+
+    def get_name(self, queryset, key, value):
+        if self.form.cleaned_data.get('mode') != SEARCH_MODE_RANKED:
+            return queryset.filter(name__istartswith=value)
+        return queryset.filter(name__icontains=value).annotate(
+            rank=Case(
+                When(name__istartswith=value, then=Value(0)),
+                default=Value(1),
+                output_field=IntegerField()
+            )
+        ).order_by('rank', 'name', 'measurement_unit')
+
+    def get_limit(self, queryset, key, value):
+        return queryset[:value]
 
 
 class BoolOrIntSelect(NullBooleanSelect):
@@ -34,10 +94,10 @@ class BoolOrIntSelect(NullBooleanSelect):
 class RecipeFilter(FilterSet):
     '''Filter for recipes.'''
 
-    tags = ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug')
+    tags = MultipleChoiceFilter(choices=get_tag_choices, method='get_tags')
+    tags_match = ChoiceFilter(
+        choices=TAGS_MATCHES, method=skip_filtration
+    )
     is_favorited = BooleanFilter(
         method='get_is_favorited', widget=BoolOrIntSelect
     )
@@ -48,7 +108,30 @@ class RecipeFilter(FilterSet):
 
     class Meta:
         model = Recipe
-        fields = ('tags', 'author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'tags', 'tags_match', 'author', 'is_favorited',
+            'is_in_shopping_cart'
+        )
+
+    def get_tags(self, queryset, key, slugs):
+        '''
+        Return the recipes having any or all of the tags,
+        checked with a semi-join on the recipe tags table,
+        which keeps the recipes unique without DISTINCT.
+        '''
+        tag_ids = [tag.pk for tag in get_tags() if tag.slug in slugs]
+        recipe_tags = Recipe.tags.through.objects.filter(
+            recipe_id=OuterRef('pk')
+        )
+        if self.form.cleaned_data.get('tags_match') != TAGS_MATCH_ALL:
+            return queryset.filter(
+                Exists(recipe_tags.filter(tag_id__in=tag_ids))
+            )
+        for tag_id in tag_ids:
+            queryset = queryset.filter(
+                Exists(recipe_tags.filter(tag_id=tag_id))
+            )
+        return queryset
 
     def base_filtration(self, queryset, value, kwargs):
         '''
@@ -66,7 +149,7 @@ class RecipeFilter(FilterSet):
         or not.
         '''
         return self.base_filtration(
-            queryset, value, kwargs={'favorite__user': self.request.user}
+            queryset, value, kwargs={'is_favorited': True}
         )
 
     def get_is_in_shopping_cart(self, queryset, key, value):
@@ -75,5 +158,5 @@ class RecipeFilter(FilterSet):
         or not.
         '''
         return self.base_filtration(
-            queryset, value, kwargs={'shopping_cart__user': self.request.user}
+            queryset, value, kwargs={'is_in_shopping_cart': True}
         )
@@ -0,0 +1,158 @@
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    CursorPagination, PageNumberPagination, _reverse_ordering
+)
+
+PAGINATION_MODE_CURSOR = 'cursor'
+COUNT_MODE_APPROXIMATE = 'approximate'
+POSITION_SEPARATOR = ','
+
+
+class ApproximateCountPaginator(Paginator):
+    '''
+    A paginator taking the number of rows from the PostgreSQL planner
+    estimate instead of COUNT(*), the count on other databases is exact.
+    '''
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+        sql, params = queryset.query.get_compiler(queryset.db).as_sql()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            return int(cursor.fetchone()[0][0]['Plan']['Plan Rows'])
+
+    def validate_number(self, number):
+        '''The page number is not checked against the estimate.'''
+        try:
+            if isinstance(number, float) and not number.is_integer():
+                raise ValueError
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def page(self, number):
+        '''
+        Read the page with one more row, the rows found past
+        the estimate or short of it correct the count.
+        '''
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if number > 1 and not rows:
+            raise EmptyPage('That page contains no results')
+        count = bottom + len(rows)
+        if len(rows) <= self.per_page or count > self.count:
+            self.__dict__['count'] = count
+            self.__dict__.pop('num_pages', None)
+        return self._get_page(rows[:self.per_page], number, self)
+
+
+class RecipeCursorPagination(CursorPagination):
+    '''
+    Keyset pagination of the recipes from the newest, the position
+    in the cursor is both the publication date and the id.
+    '''
+
+    ordering = ('-pub_date', '-id')
+
+    def _get_position_from_instance(self, instance, ordering):
+        return POSITION_SEPARATOR.join(
+            (instance.pub_date.isoformat(), str(instance.pk))
+        )
+
+    def get_position_filter(self, position, reverse):
+        '''The recipes following the position in the order of the page.'''
+        try:
+            pub_date, pk = position.split(POSITION_SEPARATOR)
+            pub_date, pk = parse_datetime(pub_date), int(pk)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if pub_date is None:
+            raise NotFound(self.invalid_cursor_message)
+        lookup = 'gt' if reverse else 'lt'
+        return Q(**{f'pub_date__{lookup}': pub_date}) | Q(
+            pub_date=pub_date, **{f'id__{lookup}': pk}
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        '''
+        CursorPagination filters by the first field of the ordering only,
+        the position is unique here, so the cursor needs no offset.
+        '''
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            offset, reverse, current_position = 0, False, None
+        else:
+            offset, reverse, current_position = self.cursor
+        queryset = queryset.order_by(
+            *(_reverse_ordering(self.ordering) if reverse else self.ordering)
+        )
+        if current_position is not None:
+            queryset = queryset.filter(
+                self.get_position_filter(current_position, reverse)
+            )
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        following_position = None
+        if len(results) > len(self.page):
+            following_position = self._get_position_from_instance(
+                results[-1], self.ordering
+            )
+        has_position = current_position is not None or offset > 0
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = (
+                has_position, following_position is not None
+            )
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next, self.has_previous = (
+                following_position is not None, has_position
+            )
+            self.next_position = following_position
+            self.previous_position = current_position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class RecipePagination(PageNumberPagination):
+    '''
+    Page number pagination of the recipes with the opt-in modes:
+    pagination=cursor switches to the keyset pagination without count,
+    count=approximate takes the count from the planner estimate.
+    '''
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_pagination = None
+        if request.query_params.get('pagination') == PAGINATION_MODE_CURSOR:
+            self.cursor_pagination = RecipeCursorPagination()
+            return self.cursor_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        if request.query_params.get('count') == COUNT_MODE_APPROXIMATE:
+            self.django_paginator_class = ApproximateCountPaginator
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_pagination:
+            return self.cursor_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,29 +1,229 @@
+import csv
+import json
+import zlib
+from abc import ABC, abstractmethod
+from itertools import islice
+
 from django.utils import timezone, dateformat
 
+SHOPPING_CART_RENDERERS = {}
+
+PDF_PAGE_WIDTH = 595
+PDF_PAGE_HEIGHT = 842
+PDF_MARGIN = 50
+PDF_FONT_SIZE = 11
+PDF_LEADING = 16
+PDF_LINES_PER_PAGE = (PDF_PAGE_HEIGHT - 2 * PDF_MARGIN) // PDF_LEADING
+PDF_ENCODING = 'cp1251'
+# Glyph names of the cp1251 cyrillic letters for the standard PDF fonts:
+# А-Я (without Ё) from 192, а-я (without ё) from 224, Ё and ё.
+PDF_CYRILLIC_GLYPHS = (
+    '192 {upper} 224 {lower} 168 /afii10023 184 /afii10071'.format(
+        upper=' '.join(
+            f'/afii{code}' for code in range(10017, 10050) if code != 10023
+        ),
+        lower=' '.join(
+            f'/afii{code}' for code in range(10065, 10098) if code != 10071
+        ),
+    )
+)
+
+
+class ShoppingList:
+    '''
+    The shopping list: (name, unit, amount) of every ingredient
+    and the names of the recipes, both read lazily by the renderers.
+    '''
+
+    def __init__(self, ingredients, recipe_names):
+        self.ingredients = ingredients
+        self.recipe_names = recipe_names
+        self.created = timezone.localtime(timezone.now())
+
+    @property
+    def created_text(self):
+        return dateformat.format(self.created, 'Y-m-d H:i:s')
+
+
+def register_renderer(format):
+    '''Add the renderer to the shopping list formats under the name.'''
+
+    def register(renderer_class):
+        renderer_class.format = format
+        SHOPPING_CART_RENDERERS[format] = renderer_class
+        return renderer_class
 
-def format_shopping_cart_report(shopping_cart):
+    return register
+
+
+class ShoppingListRenderer(ABC):
+    '''
+    Base class of the shopping list formats, the subclasses registered
+    by register_renderer set content_type and extension.
+    '''
+
+    content_type = None
+    extension = None
+
+    @abstractmethod
+    def render(self, shopping_list):
+        '''Yield the file of the shopping list chunk by chunk.'''
+
+
+@register_renderer('txt')
+class TextRenderer(ShoppingListRenderer):
     '''Format the shopping list into text for download.'''
 
-    time_now = dateformat.format(
-        timezone.localtime(timezone.now()), 'Y-m-d H:i:s'
-    )
-    for cart in shopping_cart:
-        print(f'cart = {cart}')
-
-    return '\n'.join([
-        'Карта покупок.',
-        '',
-        'Необходимо купить:',
-        *[
-            f'{i}) {ingredient["name"].capitalize()} = {ingredient["amount"]} '
-            f'{ingredient["unit"]}.'
-            for i, ingredient in enumerate(shopping_cart, 1)
-        ],
-        '',
-        'Для приготовления рецептов:',
-        *[f'{i}) {recipe_name}' for i, recipe_name in enumerate(
-            set(shopping_cart.values_list("recipe__name", flat=True)), 1
-        )],
-        '',
-        f'Дата создания карты покупок: {time_now}.'
-    ])
+    content_type = 'text/plain; charset=utf-8'
+    extension = 'txt'
+
+    def lines(self, shopping_list):
+        yield 'Карта покупок.'
+        yield ''
+        yield 'Необходимо купить:'
+        for i, (name, unit, amount) in enumerate(
+            shopping_list.ingredients, 1
+        ):
+            yield f'{i}) {name.capitalize()} = {amount} {unit}.'
+        yield ''
+        yield 'Для приготовления рецептов:'
+        for i, recipe_name in enumerate(shopping_list.recipe_names, 1):
+            yield f'{i}) {recipe_name}'
+        yield ''
+        yield f'Дата создания карты покупок: {shopping_list.created_text}.'
+
+    def render(self, shopping_list):
+        for line in self.lines(shopping_list):
+            yield f'{line}\n'
+
+
+class LineBuffer:
+    '''A file-like object returning the written line instead of storing.'''
+
+    def write(self, value):
+        return value
+
+
+@register_renderer('csv')
+class CSVRenderer(ShoppingListRenderer):
+    '''Format the ingredients of the shopping list into a CSV table.'''
+
+    content_type = 'text/csv; charset=utf-8'
+    extension = 'csv'
+
+    def render(self, shopping_list):
+        writer = csv.writer(LineBuffer())
+        yield writer.writerow(('Ингредиент', 'Количество', 'Единица'))
+        for name, unit, amount in shopping_list.ingredients:
+            yield writer.writerow((name, amount, unit))
+
+
+@register_renderer('json')
+class JSONRenderer(ShoppingListRenderer):
+    '''Format the shopping list into a JSON document.'''
+
+    content_type = 'application/json'
+    extension = 'json'
+
+    def render(self, shopping_list):
+        yield '{"ingredients": ['
+        for i, (name, unit, amount) in enumerate(
+            shopping_list.ingredients
+        ):
+            yield ', ' * bool(i) + json.dumps(
+                {'name': name, 'measurement_unit': unit, 'amount': amount},
+                ensure_ascii=False
+            )
+        yield '], "recipes": {recipes}, "created": "{created}"}}'.format(
+            recipes=json.dumps(
+                list(shopping_list.recipe_names), ensure_ascii=False
+            ),
+            created=shopping_list.created.isoformat(),
+        )
+
+
+@register_renderer('pdf')
+class PDFRenderer(ShoppingListRenderer):
+    '''
+    Format the text of the shopping list into a PDF document
+    with the standard Helvetica font, written page by page.
+    '''
+
+    content_type = 'application/pdf'
+    extension = 'pdf'
+
+    def __init__(self):
+        self.offsets = []
+        self.position = 0
+
+    def write_object(self, body):
+        self.offsets.append(self.position)
+        chunk = (
+            f'{len(self.offsets)} 0 obj\n'.encode() + body + b'\nendobj\n'
+        )
+        self.position += len(chunk)
+        return chunk
+
+    def write_stream(self, data):
+        data = zlib.compress(data)
+        return self.write_object(
+            f'<< /Length {len(data)} /Filter /FlateDecode >>\n'
+            'stream\n'.encode() + data + b'\nendstream'
+        )
+
+    @staticmethod
+    def escape(line):
+        return line.encode(PDF_ENCODING, errors='replace').replace(
+            b'\\', b'\\\\'
+        ).replace(b'(', b'\\(').replace(b')', b'\\)')
+
+    def page_content(self, lines):
+        return b''.join((
+            f'BT /F1 {PDF_FONT_SIZE} Tf {PDF_LEADING} TL '
+            f'{PDF_MARGIN} {PDF_PAGE_HEIGHT - PDF_MARGIN} Td\n'.encode(),
+            *(b'(' + self.escape(line) + b') Tj T*\n' for line in lines),
+            b'ET',
+        ))
+
+    def render(self, shopping_list):
+        chunk = b'%PDF-1.4\n'
+        self.position = len(chunk)
+        yield chunk
+        # Objects 1 and 2 are the catalog and the page tree,
+        # the page tree is written last, when the pages are known.
+        yield self.write_object(b'<< /Type /Catalog /Pages 2 0 R >>')
+        self.offsets.append(None)
+        yield self.write_object(
+            b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica '
+            b'/Encoding << /Type /Encoding /BaseEncoding /WinAnsiEncoding '
+            b'/Differences [' + PDF_CYRILLIC_GLYPHS.encode() + b'] >> >>'
+        )
+        font = len(self.offsets)
+        pages = []
+        lines = TextRenderer().lines(shopping_list)
+        while True:
+            page_lines = list(islice(lines, PDF_LINES_PER_PAGE))
+            if not page_lines:
+                break
+            yield self.write_stream(self.page_content(page_lines))
+            yield self.write_object(
+                f'<< /Type /Page /Parent 2 0 R '
+                f'/MediaBox [0 0 {PDF_PAGE_WIDTH} {PDF_PAGE_HEIGHT}] '
+                f'/Resources << /Font << /F1 {font} 0 R >> >> '
+                f'/Contents {len(self.offsets)} 0 R >>'.encode()
+            )
+            pages.append(len(self.offsets))
+        self.offsets[1] = self.position
+        kids = ' '.join(f'{page} 0 R' for page in pages)
+        chunk = (
+            f'2 0 obj\n<< /Type /Pages /Kids [{kids}] '
+            f'/Count {len(pages)} >>\nendobj\n'.encode()
+        )
+        self.position += len(chunk)
+        yield chunk
+        yield ''.join((
+            f'xref\n0 {len(self.offsets) + 1}\n0000000000 65535 f \n',
+            *(f'{offset:010d} 00000 n \n' for offset in self.offsets),
+            f'trailer\n<< /Size {len(self.offsets) + 1} /Root 1 0 R >>\n',
+            f'startxref\n{self.position}\n%%EOF\n',
+        )).encode()
@@ -0,0 +1,128 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.http import HttpResponse
+
+from backend.metrics import collect, store, timer
+from recipe.versions import get_version
+
+RESPONSE_KEY = 'response:{key}'
+COUNTER = 'foodgram_response_cache_total'
+COUNTERS = ('hits', 'misses')
+# The totals of the counters at the last reset.
+RESET_KEY = 'response_cache:reset'
+
+
+def get_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def count(name):
+    '''
+    Increment the counter in the metrics of the worker,
+    the counters are kept only with the metrics enabled.
+    '''
+    if settings.METRICS_ENABLED:
+        store.add(COUNTER, [name])
+
+
+def get_totals():
+    '''The counters written by all the workers since they started.'''
+    samples = collect()[1].get(COUNTER, {})
+    return {
+        name: samples.get(json.dumps([name]), 0) for name in COUNTERS
+    }
+
+
+def get_counters():
+    '''The counters of all the workers since the last reset.'''
+    totals = get_totals()
+    reset = cache.get(RESET_KEY) or {}
+    return {
+        name: max(totals[name] - reset.get(name, 0), 0) for name in COUNTERS
+    }
+
+
+def reset_counters():
+    cache.set(RESET_KEY, get_totals(), None)
+
+
+class ResponseCacheMixin:
+    '''
+    Keep the rendered list and detail for the anonymous users,
+    the key holds the versions of the shown data, so a change
+    of the data makes the old responses unreachable. The view
+    defines get_response_versions returning the names of the
+    versions, None when the response is not cached.
+    '''
+
+    # The query parameters changing the response, the others are ignored.
+    response_cache_params = ()
+
+    def get_response_cache_key(self):
+        request = self.request
+        if (
+            not settings.RESPONSE_CACHE_ENABLED
+            or request.method != 'GET'
+            or request.user.is_authenticated
+        ):
+            return None
+        version_names = self.get_response_versions()
+        if version_names is None:
+            return None
+        params = sorted(
+            (name, sorted(filter(None, request.query_params.getlist(name))))
+            for name in self.response_cache_params
+            if any(request.query_params.getlist(name))
+        )
+        versions = [get_version(name) for name in version_names]
+        return RESPONSE_KEY.format(key=hashlib.md5(repr((
+            self.basename,
+            self.action,
+            self.kwargs.get(self.lookup_url_kwarg or self.lookup_field),
+            request.get_host(),
+            request.accepted_renderer.format,
+            params,
+            versions,
+        )).encode()).hexdigest())
+
+    def cached(self, view, request, *args, **kwargs):
+        self.response_cache_key = self.get_response_cache_key()
+        if self.response_cache_key is None:
+            return view(request, *args, **kwargs)
+        cached = get_cache().get(self.response_cache_key)
+        if cached is None:
+            count('misses')
+            return view(request, *args, **kwargs)
+        count('hits')
+        content, content_type = cached
+        response = HttpResponse(content, content_type=content_type)
+        response['X-Cache'] = 'HIT'
+        return response
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if (
+            getattr(self, 'response_cache_key', None)
+            and response.status_code == 200
+            and 'X-Cache' not in response
+        ):
+            with timer('render'):
+                response.render()
+            get_cache().set(
+                self.response_cache_key,
+                (response.content, response['Content-Type']),
+                settings.RESPONSE_CACHE_TIMEOUT
+            )
+            response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(super().retrieve, request, *args, **kwargs)
@@ -1,16 +1,39 @@
-from django.shortcuts import get_object_or_404
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.storage import default_storage
 from djoser.serializers import UserSerializer
 from drf_extra_fields.fields import Base64ImageField
+from PIL import Image
 from rest_framework.serializers import (
     SerializerMethodField, ModelSerializer, PrimaryKeyRelatedField,
-    IntegerField
+    ValidationError
 )
 
+from backend.metrics import TimedSerializerMixin, timer
+from recipe.catalog import ingredient_catalog, tag_catalog
 from recipe.models import (
     Favorite, Follow, FoodgramUser, Product, Ingredient, Recipe, ShoppingCart,
     Tag
 )
 
+RECIPES_LIMIT = 3
+BASE64_HEADER_END = ';base64,'
+IMAGE_SIZE_ERROR_MESSAGE = 'Размер изображения больше {max_size} байт.'
+IMAGE_PIXELS_ERROR_MESSAGE = 'Изображение больше {max_pixels} пикселей.'
+
+
+def get_recipes_limit(request):
+    '''
+    Return the number of the author recipes to display
+    from the recipes_limit parameter.
+    '''
+    try:
+        recipes_limit = int(request.query_params.get('recipes_limit'))
+    except (TypeError, ValueError):
+        return RECIPES_LIMIT
+    return recipes_limit if recipes_limit >= 0 else RECIPES_LIMIT
+
 
 def get_object_availability(model, **kwargs):
     '''
@@ -23,7 +46,80 @@ def get_object_availability(model, **kwargs):
     )
 
 
-class FoodgramUserSerializer(UserSerializer):
+def get_annotated_availability(obj, annotation, model, **kwargs):
+    '''
+    Returns bool annotated on the object by the viewset queryset,
+    falls back to the query for objects loaded without the annotation.
+    '''
+    value = getattr(obj, annotation, None)
+    if value is None:
+        return get_object_availability(model, **kwargs)
+    return value
+
+
+def get_image_variants(recipe, request):
+    '''Return the URLs of the resized copies of the recipe image.'''
+    urls = {}
+    for name, path in recipe.image_variants.items():
+        url = default_storage.url(path)
+        urls[name] = request.build_absolute_uri(url) if request else url
+    return urls
+
+
+class LimitedBase64ImageField(Base64ImageField):
+    '''
+    A base64 image field rejecting the images too big
+    before decoding the data and the pixels.
+    '''
+
+    def to_internal_value(self, base64_data):
+        if isinstance(base64_data, str):
+            header_end = base64_data.find(BASE64_HEADER_END)
+            if header_end != -1:
+                header_end += len(BASE64_HEADER_END)
+            encoded_size = len(base64_data) - max(header_end, 0)
+            if encoded_size * 3 // 4 > settings.IMAGE_UPLOAD_MAX_SIZE:
+                raise ValidationError(IMAGE_SIZE_ERROR_MESSAGE.format(
+                    max_size=settings.IMAGE_UPLOAD_MAX_SIZE
+                ))
+        with timer('image'):
+            return super().to_internal_value(base64_data)
+
+    def get_file_extension(self, filename, decoded_file):
+        try:
+            # Only the header is read to know the size.
+            width, height = Image.open(BytesIO(decoded_file)).size
+        except (OSError, Image.DecompressionBombError):
+            raise ValidationError(self.INVALID_FILE_MESSAGE)
+        if width * height > settings.IMAGE_UPLOAD_MAX_PIXELS:
+            raise ValidationError(IMAGE_PIXELS_ERROR_MESSAGE.format(
+                max_pixels=settings.IMAGE_UPLOAD_MAX_PIXELS
+            ))
+        return super().get_file_extension(filename, decoded_file)
+
+
+class CatalogPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    '''
+    A primary key field looking the objects up in the catalog
+    kept in the worker memory instead of a query per value.
+    '''
+
+    def __init__(self, catalog, **kwargs):
+        self.catalog = catalog
+        super().__init__(queryset=catalog.model.objects.all(), **kwargs)
+
+    def to_internal_value(self, data):
+        if not settings.CATALOG_CACHE_ENABLED:
+            return super().to_internal_value(data)
+        if isinstance(data, (bool, dict, list)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        obj = self.catalog.get(data)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
+class FoodgramUserSerializer(TimedSerializerMixin, UserSerializer):
     '''A serializer for users.'''
 
     is_subscribed = SerializerMethodField(read_only=True)
@@ -32,12 +128,16 @@ class FoodgramUserSerializer(UserSerializer):
         fields = (*UserSerializer.Meta.fields, 'is_subscribed',)
 
     def get_is_subscribed(self, author):
-        return get_object_availability(
+        if author.pk == self.context['request'].user.pk:
+            # Nobody is subscribed to themselves, me needs no query.
+            return False
+        return get_annotated_availability(
+            author, 'is_subscribed',
             model=Follow, user=self.context['request'].user, author=author
         )
 
 
-class TagSerializer(ModelSerializer):
+class TagSerializer(TimedSerializerMixin, ModelSerializer):
     '''A serializer for tags.'''
 
     class Meta:
@@ -45,7 +145,7 @@ class TagSerializer(ModelSerializer):
         fields = '__all__'
 
 
-class ProductSerializer(ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, ModelSerializer):
     '''Serializer for products.'''
 
     class Meta:
@@ -59,7 +159,7 @@ class IngredientSerializer(ModelSerializer):
     when called from another serializer.
     '''
 
-    ingredient = PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    ingredient = CatalogPrimaryKeyRelatedField(catalog=ingredient_catalog)
 
     class Meta:
         model = Product
@@ -72,19 +172,25 @@ class IngredientSerializer(ModelSerializer):
     def to_representation(self, instance):
         result = super().to_representation(instance)
         del result['ingredient']
+        # The products of the updated recipe are loaded without
+        # their ingredients.
+        ingredient = settings.CATALOG_CACHE_ENABLED and (
+            ingredient_catalog.get(instance.ingredient_id)
+        ) or instance.ingredient
         return {
             **result,
-            **ProductSerializer().to_representation(instance.ingredient)
+            **ProductSerializer().to_representation(ingredient)
         }
 
 
-class RecipeSerializer(ModelSerializer):
+class RecipeSerializer(TimedSerializerMixin, ModelSerializer):
     '''A serializer for recipes.'''
 
     author = FoodgramUserSerializer(read_only=True)
-    image = Base64ImageField()
-    tags = PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all(), allow_empty=False
+    image = LimitedBase64ImageField()
+    image_variants = SerializerMethodField(read_only=True)
+    tags = CatalogPrimaryKeyRelatedField(
+        many=True, catalog=tag_catalog, allow_empty=False
     )
     ingredients = IngredientSerializer(
         many=True, source='products', allow_empty=False
@@ -94,24 +200,32 @@ class RecipeSerializer(ModelSerializer):
 
     class Meta:
         model = Recipe
-        exclude = 'pub_date',
+        exclude = 'pub_date', 'favorites_count', 'in_carts_count'
 
     def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
         result = super().to_representation(instance)
-        tags_id = result.pop('tags')
-        result['tags'] = [
-            TagSerializer().to_representation(
-                get_object_or_404(Tag, pk=tag_id)
-            ) for tag_id in tags_id
+        # The tags of the saved recipe are not prefetched any more,
+        # the keys serialized already are looked up in the catalog.
+        tags = settings.CATALOG_CACHE_ENABLED and [
+            tag_catalog.get(pk) for pk in result['tags']
         ]
+        if not tags or None in tags:
+            tags = instance.tags.all()
+        result['tags'] = TagSerializer(tags, many=True).data
         return result
 
+    def get_image_variants(self, obj):
+        return get_image_variants(obj, self.context.get('request'))
+
     def get_is_favorited(self, obj):
         '''
         Return the bool value the user is subscribed to the recipe
         or not.
         '''
-        return get_object_availability(
+        return get_annotated_availability(
+            obj, 'is_favorited',
             model=Favorite, user=self.context['request'].user, recipe=obj
         )
 
@@ -120,19 +234,25 @@ class RecipeSerializer(ModelSerializer):
         Return the bool value there is a recipe in the shopping list
         or not.
         '''
-        return get_object_availability(
+        return get_annotated_availability(
+            obj, 'is_in_shopping_cart',
             model=ShoppingCart, user=self.context['request'].user, recipe=obj
         )
 
 
-class InfoRecipeSerializer(ModelSerializer):
+class InfoRecipeSerializer(TimedSerializerMixin, ModelSerializer):
     '''
     A serializer for displaying recipes when called from another serializer.
     '''
 
+    image_variants = SerializerMethodField(read_only=True)
+
     class Meta:
         model = Recipe
-        fields = 'id', 'image', 'cooking_time', 'name'
+        fields = 'id', 'image', 'image_variants', 'cooking_time', 'name'
+
+    def get_image_variants(self, obj):
+        return get_image_variants(obj, self.context.get('request'))
 
 
 class FollowingSerializer(FoodgramUserSerializer):
@@ -140,8 +260,7 @@ class FollowingSerializer(FoodgramUserSerializer):
     A serializer for displaying users when called from another serializer.
     '''
 
-    recipes = InfoRecipeSerializer(read_only=True, many=True)
-    recipes_count = IntegerField(read_only=True, source='recipes.count')
+    recipes = SerializerMethodField(read_only=True)
 
     class Meta:
         model = FoodgramUser
@@ -149,20 +268,16 @@ class FollowingSerializer(FoodgramUserSerializer):
             *FoodgramUserSerializer.Meta.fields, 'recipes', 'recipes_count',
         )
 
-    def to_representation(self, instance):
-        result = super().to_representation(instance)
-        result['recipes'] = result['recipes'][:3]
-        return result
-
-
-class FollowSerializer(ModelSerializer):
-    '''Serializer for follower.'''
-
-    author = FollowingSerializer(read_only=True)
-
-    class Meta:
-        model = Follow
-        fields = 'author',
-
-    def to_representation(self, instance):
-        return super().to_representation(instance)['author']
+    def get_recipes(self, author):
+        '''
+        Return the latest recipes of the author, prefetched by the viewset
+        or read here for the objects loaded without them.
+        '''
+        recipes = getattr(author, 'limited_recipes', None)
+        if recipes is None:
+            recipes = author.recipes.all()[:get_recipes_limit(
+                self.context['request']
+            )]
+        return InfoRecipeSerializer(
+            recipes, many=True, context=self.context
+        ).data
@@ -0,0 +1,345 @@
+import threading
+from contextlib import nullcontext
+from unittest import mock
+
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils.functional import cached_property
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import APIClient
+
+from api.pagination import ApproximateCountPaginator
+from backend.query_budget import (
+    QUERY_BUDGET_ENFORCE, QUERY_BUDGETS, QueryBudgetExceeded
+)
+from recipe.models import (
+    Favorite, Follow, FoodgramUser, Ingredient, Product, Recipe, ShoppingCart,
+    ShoppingListItem, Tag
+)
+from recipe.catalog import tag_catalog
+from recipe.shopping_lists import get_live_amounts
+from recipe.versions import get_version
+
+# The variants of the image are made already, no image is processed.
+IMAGE = 'api/images/test.png'
+IMAGE_VARIANTS = {'thumbnail': 'api/images/test_thumbnail.jpg'}
+CONCURRENT_REQUESTS = 8
+
+
+def create_user(number):
+    return FoodgramUser.objects.create_user(
+        username=f'user{number}', email=f'user{number}@example.com',
+        first_name='Пользователь', last_name=str(number),
+        password='password'
+    )
+
+
+def create_recipe(author, name, tags, amounts):
+    recipe = Recipe.objects.create(
+        author=author, name=name, image=IMAGE, image_variants=IMAGE_VARIANTS,
+        text='Описание', cooking_time=10
+    )
+    recipe.tags.set(tags)
+    Product.objects.bulk_create(
+        Product(recipe=recipe, ingredient=ingredient, amount=amount)
+        for ingredient, amount in amounts
+    )
+    return recipe
+
+
+def begin_immediate(connection):
+    '''
+    SQLite fails the deferred transactions reading the rows before
+    the concurrent deletes instead of waiting as PostgreSQL does,
+    the transactions of the tests take the write lock at the start.
+    '''
+    connection.cursor().execute('BEGIN IMMEDIATE')
+
+
+def get_product_writes(queries):
+    '''The first words of the statements writing the recipe products.'''
+    return [
+        query['sql'].split(' ', 1)[0] for query in queries.captured_queries
+        if query['sql'].startswith((
+            'INSERT INTO "recipe_product"', 'UPDATE "recipe_product"',
+            'DELETE FROM "recipe_product"'
+        ))
+    ]
+
+
+@override_settings(QUERY_BUDGET_MODE=QUERY_BUDGET_ENFORCE)
+class ConcurrencyTest(TransactionTestCase):
+    '''
+    The same entry added by the concurrent requests is added once,
+    deleted by the concurrent requests is deleted once.
+    '''
+
+    def request_concurrently(self, user, method, url):
+        '''Return the sorted status codes of the concurrent requests.'''
+        barrier = threading.Barrier(CONCURRENT_REQUESTS)
+        codes = []
+
+        def send():
+            client = APIClient()
+            client.force_authenticate(user)
+            barrier.wait()
+            try:
+                codes.append(getattr(client, method)(url).status_code)
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=send) for _ in range(CONCURRENT_REQUESTS)
+        ]
+        with mock.patch.object(
+            type(connections['default']),
+            '_start_transaction_under_autocommit',
+            begin_immediate
+        ) if connection.vendor == 'sqlite' else nullcontext():
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        return sorted(codes)
+
+    def test_concurrent_requests(self):
+        user, author = create_user(1), create_user(2)
+        ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        tag = Tag.objects.create(name='Завтрак', color='#E26C2D', slug='tag')
+        recipe = create_recipe(author, 'Блины', [tag], [(ingredient, 200)])
+        for url, entries, counter in (
+            (
+                f'/api/recipes/{recipe.pk}/shopping_cart/',
+                ShoppingCart.objects.filter(user=user, recipe=recipe),
+                lambda: Recipe.objects.get(pk=recipe.pk).in_carts_count
+            ),
+            (
+                f'/api/recipes/{recipe.pk}/favorite/',
+                Favorite.objects.filter(user=user, recipe=recipe),
+                lambda: Recipe.objects.get(pk=recipe.pk).favorites_count
+            ),
+            (
+                f'/api/users/{author.pk}/subscribe/',
+                Follow.objects.filter(user=user, author=author),
+                lambda: FoodgramUser.objects.get(
+                    pk=author.pk
+                ).followers_count
+            ),
+        ):
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.request_concurrently(user, 'post', url),
+                    [status.HTTP_201_CREATED] + [
+                        status.HTTP_400_BAD_REQUEST
+                    ] * (CONCURRENT_REQUESTS - 1)
+                )
+                self.assertEqual(entries.count(), 1)
+                self.assertEqual(counter(), 1)
+                if entries.model is ShoppingCart:
+                    self.assertEqual(
+                        list(ShoppingListItem.objects.filter(
+                            user=user
+                        ).values_list('ingredient', 'amount')),
+                        [(ingredient.pk, 200)]
+                    )
+                self.assertEqual(
+                    self.request_concurrently(user, 'delete', url),
+                    [status.HTTP_204_NO_CONTENT] + [
+                        status.HTTP_404_NOT_FOUND
+                    ] * (CONCURRENT_REQUESTS - 1)
+                )
+                self.assertEqual(entries.count(), 0)
+                self.assertEqual(counter(), 0)
+                self.assertFalse(
+                    ShoppingListItem.objects.filter(user=user).exists()
+                )
+
+
+@override_settings(QUERY_BUDGET_MODE=QUERY_BUDGET_ENFORCE)
+class RecipeQueriesTest(TestCase):
+    '''The number of the SQL queries must not depend on the data size.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user(0)
+        cls.authors = [create_user(number) for number in range(1, 5)]
+        cls.tags = [
+            Tag.objects.create(
+                name=f'Тэг {number}', color=f'#00000{number}',
+                slug=f'tag{number}'
+            )
+            for number in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(5)
+        ]
+        cls.recipes = [
+            create_recipe(
+                cls.authors[number % len(cls.authors)], f'Рецепт {number}',
+                cls.tags[:number % 3 + 1],
+                [
+                    (ingredient, number + 1)
+                    for ingredient in cls.ingredients[:-1]
+                ]
+            )
+            for number in range(20)
+        ]
+        for recipe in cls.recipes[::2]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+        for recipe in cls.recipes[::3]:
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        for author in cls.authors[:2]:
+            Follow.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # The catalogs of the tags and the ingredients are loaded once.
+        self.client.get('/api/recipes/')
+
+    def test_list(self):
+        for page_size in (1, 20):
+            with self.subTest(page_size=page_size), mock.patch.object(
+                PageNumberPagination, 'page_size', page_size
+            ), self.assertNumQueries(4):
+                response = self.client.get('/api/recipes/')
+                self.assertEqual(len(response.data['results']), page_size)
+
+    def test_over_budget(self):
+        with mock.patch.dict(QUERY_BUDGETS, {'RecipeViewSet.list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.client.get('/api/recipes/')
+
+    def change_ingredients(self, amounts, queries):
+        '''Patch the ingredients of the recipe, return the product writes.'''
+        recipe = self.recipes[0]
+        self.client.force_authenticate(recipe.author)
+        data = {
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': amount}
+                for ingredient, amount in amounts
+            ],
+            'tags': [tag.pk for tag in recipe.tags.all()],
+        }
+        with self.assertNumQueries(queries) as captured:
+            response = self.client.patch(
+                f'/api/recipes/{recipe.pk}/', data, format='json'
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            sorted(recipe.products.values_list('ingredient', 'amount')),
+            sorted((ingredient.pk, amount) for ingredient, amount in amounts)
+        )
+        # The recipe is in the shopping cart of the user.
+        self.assertEqual(
+            sorted(ShoppingListItem.objects.values_list(
+                'user', 'ingredient', 'amount'
+            )),
+            sorted(
+                (*key, amount) for key, amount in get_live_amounts().items()
+            )
+        )
+        return get_product_writes(captured)
+
+    def test_update_unchanged_ingredients(self):
+        amounts = [(ingredient, 1) for ingredient in self.ingredients[:-1]]
+        self.assertEqual(self.change_ingredients(amounts, 9), [])
+
+    def test_update_ingredient_amount(self):
+        amounts = [(ingredient, 1) for ingredient in self.ingredients[:-1]]
+        amounts[0] = (self.ingredients[0], 5)
+        self.assertEqual(self.change_ingredients(amounts, 14), ['UPDATE'])
+
+    def test_update_ingredient_replaced(self):
+        amounts = [(ingredient, 1) for ingredient in self.ingredients[1:]]
+        self.assertEqual(
+            self.change_ingredients(amounts, 16), ['DELETE', 'INSERT']
+        )
+
+
+class RecipePaginationTest(TestCase):
+    '''The pages of the recipes published at the same time.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user(1)
+        tag = Tag.objects.create(name='Завтрак', color='#E26C2D', slug='tag')
+        ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        for number in range(7):
+            create_recipe(author, f'Рецепт {number}', [tag], [(ingredient, 1)])
+        pub_date = Recipe.objects.first().pub_date
+        Recipe.objects.update(pub_date=pub_date)
+        cls.recipe_ids = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        patcher = mock.patch.object(PageNumberPagination, 'page_size', 3)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def get_ids(self, response):
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_cursor(self):
+        ids, pages = [], []
+        url = '/api/recipes/?pagination=cursor'
+        while url:
+            response = self.client.get(url)
+            pages.append(response)
+            ids += self.get_ids(response)
+            url = response.data['next']
+        self.assertEqual(ids, self.recipe_ids)
+        response = self.client.get(pages[-1].data['previous'])
+        self.assertEqual(self.get_ids(response), self.get_ids(pages[-2]))
+
+    def test_underestimated_count(self):
+        # The planner estimates 2 rows of 7.
+        count = cached_property(lambda paginator: 2)
+        count.__set_name__(ApproximateCountPaginator, 'count')
+        with mock.patch.object(ApproximateCountPaginator, 'count', count):
+            response = self.client.get('/api/recipes/?count=approximate')
+            self.assertEqual(self.get_ids(response), self.recipe_ids[:3])
+            self.assertIsNotNone(response.data['next'])
+            response = self.client.get(
+                '/api/recipes/?count=approximate&page=3'
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(self.get_ids(response), self.recipe_ids[6:])
+            self.assertEqual(response.data['count'], 7)
+            self.assertIsNone(response.data['next'])
+            response = self.client.get(
+                '/api/recipes/?count=approximate&page=4'
+            )
+            self.assertEqual(
+                response.status_code, status.HTTP_404_NOT_FOUND
+            )
+
+
+class ConditionalTest(TestCase):
+
+    def get(self, now, **headers):
+        with mock.patch('api.conditional.time.time', return_value=now):
+            return self.client.get('/api/tags/', **headers)
+
+    def test_last_modified(self):
+        changed = get_version(tag_catalog.name) / 10 ** 9
+        # A change later in the same second would have the same date.
+        self.assertNotIn('Last-Modified', self.get(changed))
+        response = self.get(changed + 1)
+        last_modified = response['Last-Modified']
+        self.assertEqual(last_modified, http_date(int(changed) + 1))
+        response = self.get(
+            changed + 1, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
@@ -1,6 +1,14 @@
-from django.db.models import Sum, F
-from django.http import FileResponse
+from collections import Counter
+from itertools import chain
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import (
+    BooleanField, Exists, OuterRef, Prefetch, Subquery, Value
+)
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect
+from django_filters.utils import translate_validation
 from djoser.views import UserViewSet
 from rest_framework import status
 from rest_framework.decorators import action
@@ -9,23 +17,39 @@ from rest_framework.response import Response
 from rest_framework.serializers import ValidationError
 from rest_framework.viewsets import ModelViewSet, ReadOnlyModelViewSet
 
-from api.filters import ProductFilter, RecipeFilter
+from api.conditional import ConditionalMixin
+from api.filters import ProductFilter, RecipeFilter, SEARCH_MODE_RANKED
+from api.pagination import RecipePagination
 from api.permissions import AuthorOrReadOnly
-from api.report_generator import format_shopping_cart_report
+from api.response_cache import ResponseCacheMixin
+from api.report_generator import SHOPPING_CART_RENDERERS, ShoppingList
 from api.serializers import (
-    FollowSerializer, ProductSerializer, RecipeSerializer, TagSerializer,
-    InfoRecipeSerializer, FollowingSerializer
+    ProductSerializer, RecipeSerializer, TagSerializer,
+    InfoRecipeSerializer, FollowingSerializer, get_recipes_limit
 )
+from backend.query_budget import query_budgets
 from backend.settings import (
     DOWNLOAD_URL_PATH_NAME, SHOPPING_CART_URL_PATH_NAME,
     FAVORITE_URL_PATH_NAME, SUBSCRIBE_URL_PATH_NAME, USER_URL_PATH_NAME,
     GET_SUBSCRIPTIONS_URL_PATH_NAME
 )
+from recipe.catalog import ingredient_catalog, tag_catalog
 from recipe.models import (
     FoodgramUser, Ingredient, Recipe, ShoppingCart, Tag, Favorite, Follow,
     Product
 )
+from recipe.shopping_lists import (
+    change_recipe_in_shopping_lists, writing_products_in_bulk
+)
+from recipe.versions import (
+    AUTHORS_VERSION_NAME, RECIPES_VERSION_NAME, get_recipe_version_name
+)
 
+SHOPPING_CART_FILENAME = 'shopping_cart.{extension}'
+SHOPPING_CART_DEFAULT_FORMAT = 'txt'
+SHOPPING_CART_FORMAT_ERROR_MESSAGE = (
+    'Неизвестный формат {format}, доступные форматы: {formats}.'
+)
 SHOPPING_CART_ERROR_MESSAGE = {
     'post': 'Вы уже добавили рецепт {name} в список покупок.',
     'delete': 'У вас нет рецепта {name} в списке покупок.'
@@ -40,6 +64,7 @@ SUBSCRIPTION_ERROR_MESSAGE = {
 }
 
 
+@query_budgets(list=4, retrieve=3, me=1, get_subscriptions=4)
 class FoodgramUserViewSet(UserViewSet):
     '''A viewset for users.'''
 
@@ -48,15 +73,40 @@ class FoodgramUserViewSet(UserViewSet):
             self.permission_classes = IsAuthenticated,
         return super().get_permissions()
 
+    def get_queryset(self):
+        '''Annotate the users with the subscription of the current user.'''
+        queryset = super().get_queryset()
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        ))
+
     @action(
         methods=['GET'],
         detail=False,
         url_path=GET_SUBSCRIPTIONS_URL_PATH_NAME,
         permission_classes=[IsAuthenticated, ],
-        serializer_class=FollowSerializer,
+        serializer_class=FollowingSerializer,
     )
     def get_subscriptions(self, request):
-        queryset = self.request.user.users.all()
+        '''
+        Authors of the user's subscriptions with the recipes count and
+        only the latest recipes of every author loaded in bulk.
+        '''
+        latest_recipes = Recipe.objects.filter(pk__in=Subquery(
+            Recipe.objects.filter(
+                author=OuterRef('author')
+            ).order_by('-pub_date').values('pk')[:get_recipes_limit(request)]
+        ))
+        queryset = FoodgramUser.objects.filter(
+            authors__user=request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        ).order_by('email').prefetch_related(
+            Prefetch('recipes', latest_recipes, to_attr='limited_recipes')
+        )
 
         page = self.paginate_queryset(queryset)
         if page is not None:
@@ -77,12 +127,12 @@ class FoodgramUserViewSet(UserViewSet):
             raise ValidationError(
                 SUBSCRIPTION_ERROR_MESSAGE['auth']
             )
-        author = get_object_or_404(FoodgramUser, pk=kwargs['id'])
         if self.request.method == 'POST':
-            follower, created = Follow.objects.get_or_create(
-                author=author, user=request.user
-            )
-            if not created:
+            author = get_object_or_404(FoodgramUser, pk=kwargs['id'])
+            try:
+                with transaction.atomic():
+                    Follow.objects.create(author=author, user=request.user)
+            except IntegrityError:
                 raise ValidationError(
                     SUBSCRIPTION_ERROR_MESSAGE['post'].format(
                         last_name=author.last_name,
@@ -93,57 +143,220 @@ class FoodgramUserViewSet(UserViewSet):
                 FollowingSerializer(author, context={'request': request}).data,
                 status=status.HTTP_201_CREATED
             )
-        get_object_or_404(Follow, author=author, user=request.user).delete()
+        deleted, _ = Follow.objects.filter(
+            author_id=kwargs['id'], user=request.user
+        ).delete()
+        if not deleted:
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(ReadOnlyModelViewSet):
+class CatalogMixin:
+    '''
+    Serves the reference data from the catalog kept in the worker memory
+    instead of the database.
+    '''
+
+    catalog = None
+
+    def get_queryset(self):
+        if not settings.CATALOG_CACHE_ENABLED:
+            return super().get_queryset()
+        return self.catalog.all()
+
+    def get_object(self):
+        if not settings.CATALOG_CACHE_ENABLED:
+            return super().get_object()
+        obj = self.catalog.get(self.kwargs[self.lookup_field])
+        if obj is None:
+            raise Http404
+        self.check_object_permissions(self.request, obj)
+        return obj
+
+
+@query_budgets(list=2, retrieve=2)
+class TagViewSet(ConditionalMixin, CatalogMixin, ReadOnlyModelViewSet):
     '''A viewset for tags.'''
 
     queryset = Tag.objects.all()
+    version_names = (tag_catalog.name,)
+    catalog = tag_catalog
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
 
-class ProductViewSet(ReadOnlyModelViewSet):
+@query_budgets(list=2, retrieve=2)
+class ProductViewSet(ConditionalMixin, CatalogMixin, ReadOnlyModelViewSet):
     '''Viewset for products.'''
 
     queryset = Ingredient.objects.all()
+    version_names = (ingredient_catalog.name,)
+    catalog = ingredient_catalog
     serializer_class = ProductSerializer
     filterset_class = ProductFilter
     pagination_class = None
 
+    def filter_queryset(self, queryset):
+        if not settings.CATALOG_CACHE_ENABLED:
+            return super().filter_queryset(queryset)
+        filterset = self.filterset_class(self.request.query_params)
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        params = filterset.form.cleaned_data
+        if not params['name']:
+            return queryset[:params['limit']]
+        return self.catalog.index.search(
+            params['name'],
+            ranked=params['mode'] == SEARCH_MODE_RANKED,
+            limit=params['limit']
+        )
+
 
-class RecipeViewSet(ModelViewSet):
+@query_budgets(list=6, retrieve=5, get_shopping_cart=3)
+class RecipeViewSet(ConditionalMixin, ResponseCacheMixin, ModelViewSet):
     '''A viewset for recipes.'''
 
     queryset = Recipe.objects.all()
+    version_names = (
+        RECIPES_VERSION_NAME, tag_catalog.name, ingredient_catalog.name
+    )
+    user_versioned = True
+    response_cache_params = (
+        *RecipeFilter.base_filters, 'page', 'pagination', 'cursor', 'count'
+    )
     serializer_class = RecipeSerializer
     permission_classes = (AuthorOrReadOnly,)
     filterset_class = RecipeFilter
+    pagination_class = RecipePagination
 
+    def get_response_versions(self):
+        '''
+        The list changes with any recipe, the detail with its recipe
+        and the authors, the names of the tags and ingredients are taken
+        from the catalogs.
+        '''
+        catalog_names = [tag_catalog.name, ingredient_catalog.name]
+        if self.action == 'list':
+            return [RECIPES_VERSION_NAME, *catalog_names]
+        pk = self.kwargs['pk']
+        if not pk.isdigit() or str(int(pk)) != pk:
+            return None
+        return [
+            get_recipe_version_name(pk), AUTHORS_VERSION_NAME, *catalog_names
+        ]
+
+    def perform_content_negotiation(self, request, force=False):
+        # The format parameter of the shopping list selects the file
+        # format, not one of the API renderers.
+        return super().perform_content_negotiation(
+            request, force=force or self.action == 'get_shopping_cart'
+        )
+
+    def get_queryset(self):
+        '''
+        Load the related objects of the recipes in bulk and annotate them
+        with the flags of the current user, so that the page is serialized
+        without a query per recipe.
+        '''
+        queryset = super().get_queryset().select_related(
+            'author'
+        ).prefetch_related('tags', Prefetch(
+            'products', Product.objects.select_related('ingredient').order_by(
+                'ingredient__name', 'ingredient__measurement_unit'
+            )
+        ))
+        user = self.request.user
+        if not user.is_authenticated:
+            return queryset
+        return queryset.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef('pk'))
+            ),
+            author_is_subscribed=Exists(
+                Follow.objects.filter(user=user, author=OuterRef('author'))
+            ),
+        )
+
+    @staticmethod
+    def update_products(recipe, amounts):
+        '''
+        Bring the recipe products to the ingredient amounts changing only
+        the differing rows, return the changes of the amounts.
+        '''
+        changes = Counter()
+        kept_products = {}
+        deleted_products = []
+        # The products are prefetched with the recipe.
+        for product in recipe.products.all():
+            if (
+                product.ingredient_id in amounts
+                and product.ingredient_id not in kept_products
+            ):
+                kept_products[product.ingredient_id] = product
+            else:
+                changes[product.ingredient_id] -= product.amount
+                deleted_products.append(product.pk)
+        changed_products = []
+        for ingredient_id, product in kept_products.items():
+            if product.amount != amounts[ingredient_id]:
+                changes[ingredient_id] += (
+                    amounts[ingredient_id] - product.amount
+                )
+                product.amount = amounts[ingredient_id]
+                changed_products.append(product)
+        if deleted_products:
+            Product.objects.filter(pk__in=deleted_products).delete()
+        if changed_products:
+            Product.objects.bulk_update(changed_products, ['amount'])
+        new_products = [
+            Product(recipe=recipe, ingredient_id=ingredient_id, amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in kept_products
+        ]
+        if new_products:
+            Product.objects.bulk_create(new_products)
+        changes.update({
+            product.ingredient_id: product.amount for product in new_products
+        })
+        return changes
+
+    @transaction.atomic
     def make_ingredients(self, serializer, recipe=None):
 
-        ingredients_data = serializer.validated_data.pop('products')
-        if recipe:
-            Product.objects.filter(recipe_id=recipe.pk).delete()
+        amounts = Counter()
+        for ingredient_data in serializer.validated_data.pop('products'):
+            amounts[ingredient_data['ingredient'].pk] += (
+                ingredient_data['amount']
+            )
+        is_new = recipe is None
         recipe = serializer.save(
             author=self.request.user, **serializer.validated_data
         )
-        Product.objects.bulk_create(
-            Product(
-                recipe=recipe, amount=ingredient_data['amount'],
-                ingredient=ingredient_data['ingredient']
+        if is_new:
+            Product.objects.bulk_create(
+                Product(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=amount
+                )
+                for ingredient_id, amount in amounts.items()
             )
-            for ingredient_data in ingredients_data
-        )
+            return
+        # The signals of the deleted products skip the recipe, its shopping
+        # lists are changed once and its version is bumped by the save.
+        with writing_products_in_bulk(recipe.pk):
+            changes = self.update_products(recipe, amounts)
+        change_recipe_in_shopping_lists(recipe.pk, changes)
 
     def perform_create(self, serializer):
         self.make_ingredients(serializer=serializer)
 
     def perform_update(self, serializer):
-        self.make_ingredients(serializer=serializer, recipe=self.get_object())
+        self.make_ingredients(
+            serializer=serializer, recipe=serializer.instance
+        )
 
     @action(
         methods=['GET'],
@@ -152,28 +365,51 @@ class RecipeViewSet(ModelViewSet):
         permission_classes=[IsAuthenticated, ]
     )
     def get_shopping_cart(self, request):
-        '''Download the list of ingredients to buy.'''
+        '''
+        Download the list of ingredients to buy
+        in the format from the format parameter.
+        '''
 
-        if not ShoppingCart.objects.filter(user=request.user.pk).exists():
+        format = request.query_params.get(
+            'format', SHOPPING_CART_DEFAULT_FORMAT
+        )
+        if format not in SHOPPING_CART_RENDERERS:
+            raise ValidationError(SHOPPING_CART_FORMAT_ERROR_MESSAGE.format(
+                format=format, formats=', '.join(SHOPPING_CART_RENDERERS)
+            ))
+        renderer = SHOPPING_CART_RENDERERS[format]()
+        ingredients = request.user.shopping_list_items.values_list(
+            'ingredient__name', 'ingredient__measurement_unit', 'amount'
+        ).order_by('ingredient__name', 'ingredient_id').iterator()
+        first_ingredient = next(ingredients, None)
+        if first_ingredient is None:
             return redirect('recipes-list')
-        shopping_cart = FoodgramUser.objects.get(
-            pk=request.user.pk
-        ).shoppingcarts.values(
-            'recipe__products__ingredient_id',
-            unit=F('recipe__products__ingredient__measurement_unit'),
-            name=F('recipe__products__ingredient__name'),
-        ).annotate(
-            amount=Sum('recipe__products__amount')
-        ).order_by('recipe__products__ingredient_id')
-        return FileResponse(format_shopping_cart_report(shopping_cart))
+        recipe_names = request.user.shoppingcarts.values_list(
+            'recipe__name', flat=True
+        ).order_by('recipe__name').distinct()
+        response = StreamingHttpResponse(
+            renderer.render(ShoppingList(
+                chain([first_ingredient], ingredients), recipe_names
+            )),
+            content_type=renderer.content_type
+        )
+        response['Content-Disposition'] = 'attachment; filename="{}"'.format(
+            SHOPPING_CART_FILENAME.format(extension=renderer.extension)
+        )
+        return response
 
     def change_recipe_related_entries(self, pk, table, err_message):
-        recipe = get_object_or_404(Recipe, pk=pk)
+        '''
+        Add or delete the entry with a single statement, the unique
+        constraint of the table resolves the concurrent requests.
+        '''
+        user = self.request.user
         if self.request.method == 'POST':
-            obj, created = table.objects.get_or_create(
-                recipe=recipe, user=self.request.user
-            )
-            if not created:
+            recipe = get_object_or_404(Recipe, pk=pk)
+            try:
+                with transaction.atomic():
+                    table.objects.create(recipe=recipe, user=user)
+            except IntegrityError:
                 raise ValidationError(
                     err_message['post'].format(name=recipe.name)
                 )
@@ -181,9 +417,10 @@ class RecipeViewSet(ModelViewSet):
                 InfoRecipeSerializer(recipe).data,
                 status=status.HTTP_201_CREATED
             )
-        get_object_or_404(
-            table, recipe=recipe, user=self.request.user
-        ).delete()
+        with transaction.atomic():
+            deleted, _ = table.objects.filter(recipe_id=pk, user=user).delete()
+            if not deleted:
+                raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
 
     @action(
@@ -0,0 +1,342 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import Http404, HttpResponse
+
+METRICS_FILE = '{pid}.json'
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+UNKNOWN_ROUTE = 'unknown'
+SECONDS_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf')
+)
+QUERIES_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, float('inf'))
+# The histograms and the counters: the name, the help and the labels.
+HISTOGRAMS = {
+    'foodgram_request_duration_seconds': (
+        'Time of the request until the response is ready.',
+        ('route', 'method', 'cache'), SECONDS_BUCKETS
+    ),
+    'foodgram_request_db_queries': (
+        'SQL queries made by the request.', ('route', 'method'),
+        QUERIES_BUCKETS
+    ),
+}
+COUNTERS = {
+    'foodgram_requests_total': (
+        'Requests by the response status.',
+        ('route', 'method', 'cache', 'status')
+    ),
+    'foodgram_request_db_seconds_total': (
+        'Time of the SQL queries of the requests.', ('route', 'method')
+    ),
+    'foodgram_request_serialize_seconds_total': (
+        'Time of the serializers of the requests.', ('route', 'method')
+    ),
+    'foodgram_request_render_seconds_total': (
+        'Time of the rendering of the responses, the responses '
+        'of the response cache are not rendered.', ('route', 'method')
+    ),
+    'foodgram_response_cache_total': (
+        'Anonymous responses by the result of the response cache.',
+        ('result',)
+    ),
+}
+
+current_timings = ContextVar('current_timings', default=None)
+
+
+class RequestTimings:
+    '''The time of the request spent by the database, serializers etc.'''
+
+    def __init__(self):
+        self.queries = 0
+        self.durations = {}
+        # The nested timers of the same name are counted once.
+        self.running = set()
+
+    def add(self, name, duration):
+        self.durations[name] = self.durations.get(name, 0) + duration
+
+    def execute(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.add('db', time.perf_counter() - started)
+
+    def server_timing(self, total):
+        '''The value of the Server-Timing header, durations in ms.'''
+        metrics = [f'db;dur={self.durations.get("db", 0) * 1000:.1f};'
+                   f'desc="{self.queries} queries"']
+        metrics.extend(
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in self.durations.items() if name != 'db'
+        )
+        metrics.append(f'total;dur={total * 1000:.1f}')
+        return ', '.join(metrics)
+
+
+@contextmanager
+def timer(name):
+    '''Add the time of the block to the timings of the current request.'''
+    timings = current_timings.get()
+    if timings is None or name in timings.running:
+        yield
+        return
+    timings.running.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.running.discard(name)
+        timings.add(name, time.perf_counter() - started)
+
+
+class TimedSerializerMixin:
+    '''Count the time of the serializer output as serialize.'''
+
+    def to_representation(self, instance):
+        with timer('serialize'):
+            return super().to_representation(instance)
+
+
+class MetricsStore:
+    '''
+    The metrics of the worker, written into a file of the process
+    from time to time, the metrics endpoint sums the files of all
+    the workers. The file of the same pid left by a stopped worker
+    is continued, so the counters never go back.
+    '''
+
+    def __init__(self):
+        self.lock = Lock()
+        self.pid = None
+        self.flushed = 0
+        self.histograms = {}
+        self.counters = {}
+
+    @property
+    def path(self):
+        return os.path.join(
+            settings.METRICS_DIR, METRICS_FILE.format(pid=self.pid)
+        )
+
+    def prepare(self):
+        # The workers are forked after the store is created.
+        if self.pid == os.getpid():
+            return
+        self.pid = os.getpid()
+        data = read_metrics_file(self.path) or {}
+        self.histograms = data.get('histograms', {})
+        self.counters = data.get('counters', {})
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][2]
+        samples = self.histograms.setdefault(name, {}).setdefault(
+            json.dumps(labels), [0] * len(buckets) + [0]
+        )
+        samples[bisect_left(buckets, value)] += 1
+        samples[-1] += value
+
+    def increment(self, name, labels, value=1):
+        samples = self.counters.setdefault(name, {})
+        key = json.dumps(labels)
+        samples[key] = samples.get(key, 0) + value
+
+    def record(self, request, response, timings, total):
+        match = request.resolver_match
+        route = match.view_name if match else UNKNOWN_ROUTE
+        labels = [route, request.method]
+        # The hits of the response cache are neither serialized
+        # nor rendered, their time is apart from the others.
+        cache_labels = labels + [response.get('X-Cache', 'none').lower()]
+        with self.lock:
+            self.prepare()
+            self.observe(
+                'foodgram_request_duration_seconds', cache_labels, total
+            )
+            self.observe(
+                'foodgram_request_db_queries', labels, timings.queries
+            )
+            self.increment(
+                'foodgram_requests_total',
+                cache_labels + [str(response.status_code)]
+            )
+            for name, counter in (
+                ('db', 'foodgram_request_db_seconds_total'),
+                ('serialize', 'foodgram_request_serialize_seconds_total'),
+                ('render', 'foodgram_request_render_seconds_total'),
+            ):
+                if name in timings.durations:
+                    self.increment(counter, labels, timings.durations[name])
+            self.flush_if_due()
+
+    def add(self, name, labels, value=1):
+        '''Increment the counter outside of the request metrics.'''
+        with self.lock:
+            self.prepare()
+            self.increment(name, labels, value)
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        if time.monotonic() - self.flushed > settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self.flushed = time.monotonic()
+        os.makedirs(settings.METRICS_DIR, exist_ok=True)
+        temporary_path = f'{self.path}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(
+                {'histograms': self.histograms, 'counters': self.counters},
+                file
+            )
+        os.replace(temporary_path, self.path)
+
+
+store = MetricsStore()
+
+
+def read_metrics_file(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def collect():
+    '''Sum the metrics written by all the workers.'''
+    histograms = {}
+    counters = {}
+    if not os.path.isdir(settings.METRICS_DIR):
+        return histograms, counters
+    for filename in os.listdir(settings.METRICS_DIR):
+        if not filename.endswith('.json'):
+            continue
+        data = read_metrics_file(os.path.join(settings.METRICS_DIR, filename))
+        if data is None:
+            continue
+        for name, samples in data['histograms'].items():
+            total = histograms.setdefault(name, {})
+            for key, values in samples.items():
+                total[key] = [
+                    a + b for a, b in zip(total.get(key, [0] * len(values)),
+                                          values)
+                ]
+        for name, samples in data['counters'].items():
+            total = counters.setdefault(name, {})
+            for key, value in samples.items():
+                total[key] = total.get(key, 0) + value
+    return histograms, counters
+
+
+def format_labels(names, values, **extra):
+    pairs = list(zip(names, values)) + list(extra.items())
+    return '{' + ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"'
+        ).replace('\n', '\\n'))
+        for name, value in pairs
+    ) + '}'
+
+
+def format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(float(bound))
+
+
+def render_metrics(histograms, counters):
+    '''The metrics in the Prometheus text format.'''
+    lines = []
+    for name, (help_text, label_names, buckets) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for key, values in sorted(histograms.get(name, {}).items()):
+            labels = json.loads(key)
+            cumulative = 0
+            for bound, count in zip(buckets, values):
+                cumulative += count
+                bucket_labels = format_labels(
+                    label_names, labels, le=format_bound(bound)
+                )
+                lines.append(f'{name}_bucket{bucket_labels} {cumulative}')
+            lines.append(
+                f'{name}_sum{format_labels(label_names, labels)} {values[-1]}'
+            )
+            lines.append(
+                f'{name}_count{format_labels(label_names, labels)} '
+                f'{cumulative}'
+            )
+    for name, (help_text, label_names) in COUNTERS.items():
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for key, value in sorted(counters.get(name, {}).items()):
+            lines.append(
+                f'{name}{format_labels(label_names, json.loads(key))} {value}'
+            )
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    '''The metrics of all the workers for Prometheus.'''
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    if settings.METRICS_TOKEN and request.headers.get('Authorization') != (
+        f'Bearer {settings.METRICS_TOKEN}'
+    ):
+        raise Http404
+    with store.lock:
+        store.prepare()
+        store.flush()
+    return HttpResponse(
+        render_metrics(*collect()), content_type=METRICS_CONTENT_TYPE
+    )
+
+
+class MetricsMiddleware:
+    '''
+    Measure the SQL queries, the serializers, the rendering and the total
+    time of the request, send them in the Server-Timing header and add them
+    to the metrics of the route. The streamed part of the response is sent
+    after the middleware and is not counted.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timings = RequestTimings()
+        token = current_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with connection.execute_wrapper(timings.execute):
+                response = self.get_response(request)
+        finally:
+            current_timings.reset(token)
+        total = time.perf_counter() - started
+        response['Server-Timing'] = timings.server_timing(total)
+        store.record(request, response, timings, total)
+        return response
+
+    def process_template_response(self, request, response):
+        # The response stored by the response cache is rendered
+        # by the view, the time is counted there.
+        if response.is_rendered:
+            return response
+        timings = current_timings.get()
+        started = time.perf_counter()
+        response.add_post_render_callback(
+            lambda response: timings.add(
+                'render', time.perf_counter() - started
+            )
+        )
+        return response
@@ -0,0 +1,163 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+
+from api.authentication import CachedTokenAuthentication
+from backend.query_budget import get_project_stack
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+PROFILE_CONTENT_TYPE = 'text/plain; charset=utf-8'
+# The heading of the stacks, the lines after it are the collapsed stacks.
+STACKS_HEADING = '# Stacks'
+# The prefixes cut from the file names of the frames.
+PATH_PREFIXES = sorted(
+    {str(settings.BASE_DIR) + os.sep}
+    | {path + os.sep for path in sys.path if path},
+    key=len, reverse=True
+)
+
+
+def get_frame_name(code):
+    filename = code.co_filename
+    for prefix in PATH_PREFIXES:
+        if filename.startswith(prefix):
+            filename = filename[len(prefix):]
+            break
+    return f'{filename}:{code.co_name}'.replace(' ', '_').replace(';', ':')
+
+
+class SamplingProfiler:
+    '''
+    Sample the stack of the thread from another thread, the samples
+    are counted in the collapsed stacks format of the flame graphs.
+    '''
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(get_frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.samples[';'.join(reversed(stack))] += 1
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+
+    def collapsed(self):
+        return ''.join(
+            f'{stack} {count}\n' for stack, count in self.samples.items()
+        )
+
+
+class SQLLog:
+    '''The SQL queries with their time and the project code making them.'''
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((
+                time.perf_counter() - started, sql, params,
+                get_project_stack()
+            ))
+
+    def text(self):
+        lines = [
+            f'{len(self.queries)} queries in '
+            f'{sum(query[0] for query in self.queries) * 1000:.1f} ms'
+        ]
+        for duration, sql, params, stack in self.queries:
+            lines.append(f'{duration * 1000:.1f} ms {sql} {params!r}')
+            lines.extend(
+                f'    {frame.filename}:{frame.lineno} in {frame.name}'
+                for frame in stack
+            )
+        return '\n'.join(lines) + '\n'
+
+
+def is_staff(request):
+    '''Whether the user of the token or of the session is a staff user.'''
+    try:
+        authenticated = CachedTokenAuthentication().authenticate(
+            Request(request)
+        )
+    except AuthenticationFailed:
+        return False
+    user = authenticated[0] if authenticated else request.user
+    return user.is_staff
+
+
+class ProfilerMiddleware:
+    '''
+    Profile the request of a staff user with the X-Profile header or
+    the profile parameter: the report returned instead of the response
+    has the queries with their time and stacks, then the samples of the
+    request in the collapsed stacks format. One request of the worker
+    is profiled at a time, the others run as usual. The user is
+    authenticated before the view, the requests of the other users
+    are not profiled. Goes after AuthenticationMiddleware.
+    '''
+
+    def __init__(self, get_response):
+        if not settings.PROFILER_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.lock = threading.Lock()
+
+    def __call__(self, request):
+        profiled = request.headers.get(
+            PROFILE_HEADER, request.GET.get(PROFILE_PARAM)
+        )
+        if not profiled or not is_staff(request) or (
+            not self.lock.acquire(blocking=False)
+        ):
+            return self.get_response(request)
+        try:
+            sql_log = SQLLog()
+            started = time.perf_counter()
+            with SamplingProfiler(
+                threading.get_ident(), settings.PROFILER_INTERVAL
+            ) as profiler, connection.execute_wrapper(sql_log):
+                response = self.get_response(request)
+                # The streamed responses make the queries while sent.
+                if response.streaming:
+                    b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        finally:
+            self.lock.release()
+        profile = HttpResponse(
+            f'{sql_log.text()}\n{STACKS_HEADING}\n{profiler.collapsed()}',
+            content_type=PROFILE_CONTENT_TYPE
+        )
+        profile['X-Profile-Status'] = response.status_code
+        profile['X-Profile-Time'] = f'{elapsed * 1000:.1f}'
+        profile['X-Profile-Samples'] = sum(profiler.samples.values())
+        return profile
@@ -0,0 +1,153 @@
+import logging
+import re
+import traceback
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+QUERY_BUDGET_OFF = 'off'
+QUERY_BUDGET_WARN = 'warn'
+QUERY_BUDGET_ENFORCE = 'enforce'
+# The project frames shown in the stack of every query.
+STACK_DEPTH = 6
+IN_LIST = re.compile(r'\(\s*%s(?:\s*,\s*%s)*\s*\)')
+# The maximum SQL queries of a view by its name: ViewSet.action
+# for the DRF viewsets, the url name for the other views.
+QUERY_BUDGETS = {}
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def query_budgets(**budgets):
+    '''
+    Declare the maximum SQL queries of the viewset actions,
+    the budget must not depend on the page size.
+    '''
+
+    def register(viewset):
+        for action, queries in budgets.items():
+            QUERY_BUDGETS[f'{viewset.__name__}.{action}'] = queries
+        return viewset
+
+    return register
+
+
+def set_query_budget(name, queries):
+    '''Declare the maximum SQL queries of the view with the url name.'''
+    QUERY_BUDGETS[name] = queries
+
+
+def get_view_name(resolver_match, method):
+    '''The name of the resolved view in the budgets.'''
+    if resolver_match is None:
+        return None
+    view = resolver_match.func
+    actions = getattr(view, 'actions', None)
+    if actions and method.lower() in actions:
+        return f'{view.cls.__name__}.{actions[method.lower()]}'
+    return resolver_match.view_name
+
+
+def get_query_shape(sql):
+    '''The SQL with the lists of the IN parameters collapsed.'''
+    return IN_LIST.sub('(...)', sql)
+
+
+def get_project_stack():
+    '''The innermost frames of the project code making the query.'''
+    base_dir = str(settings.BASE_DIR)
+    return [
+        frame for frame in traceback.extract_stack()[:-2]
+        if frame.filename.startswith(base_dir)
+        and 'site-packages' not in frame.filename
+    ][-STACK_DEPTH:]
+
+
+class QueryLog:
+    '''The SQL queries of the request with the stacks making them.'''
+
+    def __init__(self, stacks=False):
+        self.stacks = stacks
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.queries.append(
+            (sql, get_project_stack() if self.stacks else None)
+        )
+        return execute(sql, params, many, context)
+
+    def __len__(self):
+        return len(self.queries)
+
+    def get_duplicates(self):
+        '''The query shapes made more than once with their counts.'''
+        return [
+            (shape, count) for shape, count in Counter(
+                get_query_shape(sql) for sql, _ in self.queries
+            ).most_common() if count > 1
+        ]
+
+    def report(self):
+        lines = []
+        for number, (sql, stack) in enumerate(self.queries, 1):
+            lines.append(f'{number}. {sql}')
+            lines.extend(
+                f'    {frame.filename}:{frame.lineno} in {frame.name}'
+                for frame in stack or ()
+            )
+        duplicates = self.get_duplicates()
+        if duplicates:
+            lines.append('Duplicated queries:')
+            lines.extend(
+                f'{count} x {shape}' for shape, count in duplicates
+            )
+        return '\n'.join(lines)
+
+
+def check_query_budget(name, query_log):
+    '''Fail or warn when the view made more queries than its budget.'''
+    budget = QUERY_BUDGETS.get(name)
+    if budget is None or len(query_log) <= budget:
+        return
+    message = (
+        f'{name} made {len(query_log)} SQL queries, '
+        f'the budget is {budget}.\n{query_log.report()}'
+    )
+    if settings.QUERY_BUDGET_MODE == QUERY_BUDGET_ENFORCE:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class QueryBudgetMiddleware:
+    '''
+    Count the SQL queries of the request and compare them with the budget
+    of the view: enforce raises QueryBudgetExceeded with the queries
+    and their stacks, warn logs them with the duplicated queries.
+    The queries of the streamed part of the response are not counted.
+    '''
+
+    def __init__(self, get_response):
+        if settings.QUERY_BUDGET_MODE not in (
+            QUERY_BUDGET_WARN, QUERY_BUDGET_ENFORCE
+        ):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        query_log = QueryLog(
+            stacks=settings.QUERY_BUDGET_MODE == QUERY_BUDGET_ENFORCE
+        )
+        with connection.execute_wrapper(query_log):
+            response = self.get_response(request)
+        name = get_view_name(request.resolver_match, request.method)
+        check_query_budget(name, query_log)
+        if settings.QUERY_BUDGET_MODE == QUERY_BUDGET_WARN:
+            for shape, count in query_log.get_duplicates():
+                logger.warning('%s made %s x %s', name, count, shape)
+        return response
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -30,11 +31,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.metrics.MetricsMiddleware',
+    'backend.query_budget.QueryBudgetMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.profiler.ProfilerMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -65,8 +69,12 @@ if os.getenv('ENV_TYPE') == 'test':
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # The threads of the tests share a file, not the memory.
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
         }
     }
+    # The included amount of the product index is PostgreSQL only.
+    SILENCED_SYSTEM_CHECKS = ['models.W040']
 else:
     DATABASES = {
         'default': {
@@ -80,6 +88,95 @@ else:
     }
 
 
+FILE_BASED_CACHE = 'django.core.cache.backends.filebased.FileBasedCache'
+
+# The default cache keeps the versions of the data shared by the workers,
+# the responses have a cache of their own. Every write into the file based
+# cache lists its directory to cull it, the production sets a shared cache
+# like memcached: CACHE_BACKEND and CACHE_LOCATION.
+if os.getenv('ENV_TYPE') == 'test':
+    # The tests do not share the cache with the dev server.
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'foodgram',
+        },
+        'responses': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'foodgram_responses',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': os.getenv('CACHE_BACKEND', FILE_BASED_CACHE),
+            'LOCATION': os.getenv(
+                'CACHE_LOCATION',
+                os.path.join(tempfile.gettempdir(), 'foodgram_cache')
+            ),
+        },
+        'responses': {
+            'BACKEND': os.getenv('RESPONSE_CACHE_BACKEND', FILE_BASED_CACHE),
+            'LOCATION': os.getenv(
+                'RESPONSE_CACHE_LOCATION',
+                os.path.join(tempfile.gettempdir(), 'foodgram_responses')
+            ),
+        },
+    }
+    # The culled versions only make the cached responses miss.
+    if CACHES['default']['BACKEND'] == FILE_BASED_CACHE:
+        CACHES['default']['OPTIONS'] = {
+            'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+        }
+    if CACHES['responses']['BACKEND'] == FILE_BASED_CACHE:
+        CACHES['responses']['OPTIONS'] = {
+            'MAX_ENTRIES': int(
+                os.getenv('RESPONSE_CACHE_MAX_ENTRIES', 10000)
+            ),
+        }
+
+CATALOG_CACHE_ENABLED = os.getenv('CATALOG_CACHE_ENABLED', 'True') == 'True'
+
+RESPONSE_CACHE_ENABLED = (
+    os.getenv('RESPONSE_CACHE_ENABLED', 'True') == 'True'
+)
+RESPONSE_CACHE_ALIAS = os.getenv('RESPONSE_CACHE_ALIAS', 'responses')
+RESPONSE_CACHE_TIMEOUT = int(os.getenv('RESPONSE_CACHE_TIMEOUT', 600))
+
+IMAGE_UPLOAD_MAX_SIZE = int(
+    os.getenv('IMAGE_UPLOAD_MAX_SIZE', 5 * 1024 * 1024)
+)
+IMAGE_UPLOAD_MAX_PIXELS = int(
+    os.getenv('IMAGE_UPLOAD_MAX_PIXELS', 25 * 1000 * 1000)
+)
+# The image is sent in base64 inside the JSON body of the recipe.
+DATA_UPLOAD_MAX_MEMORY_SIZE = IMAGE_UPLOAD_MAX_SIZE * 4 // 3 + 1024 * 1024
+# The threads making the image variants, 0 makes them in the request.
+IMAGE_PIPELINE_WORKERS = int(os.getenv('IMAGE_PIPELINE_WORKERS', 2))
+
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'False') == 'True'
+# Every worker writes its metrics into the directory shared by the workers.
+METRICS_DIR = os.getenv(
+    'METRICS_DIR', os.path.join(tempfile.gettempdir(), 'foodgram_metrics')
+)
+METRICS_FLUSH_INTERVAL = int(os.getenv('METRICS_FLUSH_INTERVAL', 5))
+# The bearer token of the metrics endpoint, empty to keep it open.
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# off, warn to log the views over their SQL query budget
+# or enforce to raise an error, for the tests and the benchmarks.
+QUERY_BUDGET_MODE = os.getenv('QUERY_BUDGET_MODE', 'off')
+
+# The staff users profile a request with the X-Profile header
+# or the profile parameter, the report has the queries and the stacks.
+PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'False') == 'True'
+PROFILER_INTERVAL = float(os.getenv('PROFILER_INTERVAL', 0.005))
+
+# The users of the tokens kept by every worker, in seconds.
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 60))
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 1024))
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -123,7 +220,7 @@ REST_FRAMEWORK = {
     ],
 
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
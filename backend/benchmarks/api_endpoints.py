@@ -0,0 +1,227 @@
+'''
+Latency percentiles, SQL query counts and peak memory of the main API
+endpoints on the synthetic dataset of benchmarks.seed, printed as JSON
+to compare the results between commits.
+
+The requests go through the DRF test client as the first generated user,
+the response cache is switched off to measure the views themselves.
+
+Run from the backend directory on a throwaway database:
+python -m benchmarks.api_endpoints --scale medium --output before.json
+python -m benchmarks.api_endpoints --scale medium --baseline before.json
+on the configured database filled by benchmarks.seed:
+python -m benchmarks.api_endpoints --existing
+'''
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from contextlib import nullcontext
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from benchmarks.seed import (  # noqa: E402
+    add_scale_arguments, get_scale, seed
+)
+from benchmarks.utils import test_database  # noqa: E402
+from recipe.models import FoodgramUser, Recipe, Tag  # noqa: E402
+
+REPEAT = 20
+WARMUP = 2
+ENDPOINTS = {
+    'recipes': '/api/recipes/',
+    'recipes_page_100': '/api/recipes/?page=100',
+    'recipes_by_tag': '/api/recipes/?tags={tag}',
+    'recipes_by_author': '/api/recipes/?author={author}',
+    'recipes_favorited': '/api/recipes/?is_favorited=1',
+    'recipes_in_shopping_cart': '/api/recipes/?is_in_shopping_cart=1',
+    'recipe': '/api/recipes/{recipe}/',
+    'subscriptions': '/api/users/subscriptions/',
+    'users': '/api/users/',
+    'ingredients_search': '/api/ingredients/?name=ингредиент 1',
+    'download_shopping_cart': '/api/recipes/download_shopping_cart/',
+    'download_shopping_cart_pdf':
+        '/api/recipes/download_shopping_cart/?format=pdf',
+}
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def request(client, url):
+    '''Make the request and read the whole body of the response.'''
+    response = client.get(url)
+    if response.streaming:
+        b''.join(response.streaming_content)
+    else:
+        response.content
+    return response
+
+
+def count_queries(client, url):
+    '''Return the response and the number of the SQL queries it made.'''
+    queries = 0
+
+    def execute(execute, sql, params, many, context):
+        nonlocal queries
+        queries += 1
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(execute):
+        response = request(client, url)
+    return response, queries
+
+
+def percentile(timings, percent):
+    return statistics.quantiles(
+        timings, n=100, method='inclusive'
+    )[percent - 1]
+
+
+def run(client, url, repeat):
+    for _ in range(WARMUP):
+        request(client, url)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        request(client, url)
+        timings.append((time.perf_counter() - started) * 1000)
+    response, queries = count_queries(client, url)
+    # A separate request, the tracing slows down the timed ones.
+    tracemalloc.start()
+    try:
+        request(client, url)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        'url': url,
+        'status': response.status_code,
+        'p50_ms': round(percentile(timings, 50), 2),
+        'p95_ms': round(percentile(timings, 95), 2),
+        'queries': queries,
+        'peak_memory_kb': round(peak / 1024, 1),
+    }
+
+
+def run_all(repeat, endpoints):
+    user = FoodgramUser.objects.order_by('pk').first()
+    if user is None:
+        sys.exit('The database is empty, fill it with benchmarks.seed.')
+    token, _ = Token.objects.get_or_create(user=user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+    values = dict(
+        tag=Tag.objects.order_by('pk').values_list('slug', flat=True)[0],
+        author=user.pk,
+        recipe=Recipe.objects.order_by('-pub_date', '-pk').values_list(
+            'pk', flat=True
+        )[0],
+    )
+    cache.clear()
+    results = {}
+    for name in endpoints:
+        results[name] = run(
+            client, ENDPOINTS[name].format(**values), repeat
+        )
+        print(
+            f'{name:<28}{results[name]["p50_ms"]:>10.1f}'
+            f'{results[name]["p95_ms"]:>10.1f}'
+            f'{results[name]["queries"]:>6}', file=sys.stderr
+        )
+    return results
+
+
+def compare(results, baseline):
+    '''Print the changes against the results of another run.'''
+    print(
+        f'{"":<28}{"p50 before":>12}{"after":>10}'
+        f'{"queries before":>16}{"after":>7}', file=sys.stderr
+    )
+    for name, result in results.items():
+        before = baseline['endpoints'].get(name)
+        if before is None:
+            continue
+        print(
+            f'{name:<28}{before["p50_ms"]:>12.1f}{result["p50_ms"]:>10.1f}'
+            f'{before["queries"]:>16}{result["queries"]:>7}'
+            + (' slower' if result['p50_ms'] > before['p50_ms'] * 1.2
+               else '')
+            + (' more queries' if result['queries'] > before['queries']
+               else ''),
+            file=sys.stderr
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    add_scale_arguments(parser)
+    parser.add_argument('--repeat', type=int, default=REPEAT)
+    parser.add_argument(
+        '--endpoint', action='append', choices=ENDPOINTS, dest='endpoints',
+        help='Measure only the endpoint, can be repeated.'
+    )
+    parser.add_argument(
+        '--existing', action='store_true',
+        help='Use the configured database already filled by the seed.'
+    )
+    parser.add_argument('--output', help='Write the JSON into the file.')
+    parser.add_argument(
+        '--baseline', help='Compare with the JSON of a previous run.'
+    )
+    args = parser.parse_args()
+    scale = None if args.existing else get_scale(args)
+    with nullcontext() if args.existing else test_database():
+        if scale:
+            seed(scale, args.seed, log=lambda line: print(
+                line, file=sys.stderr
+            ))
+        with override_settings(RESPONSE_CACHE_ENABLED=False):
+            results = run_all(args.repeat, args.endpoints or ENDPOINTS)
+        vendor = connection.vendor
+    report = {
+        'commit': get_commit(),
+        'database': vendor,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'scale': scale,
+        'seed': None if args.existing else args.seed,
+        'repeat': args.repeat,
+        'endpoints': results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            file.write(text + '\n')
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as file:
+            compare(results, json.load(file))
+
+
+if __name__ == '__main__':
+    main()
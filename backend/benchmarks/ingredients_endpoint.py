@@ -0,0 +1,81 @@
+'''
+Latency of the ingredients endpoint read from the database
+with and without the unique (name, measurement_unit) index.
+
+Run from the backend directory:
+python -m benchmarks.ingredients_endpoint --size 100000
+'''
+import argparse
+import os
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from benchmarks.utils import (  # noqa: E402
+    BATCH_SIZE, measure, test_database
+)
+from recipe.models import Ingredient  # noqa: E402
+
+UNITS = ('г', 'кг', 'мл', 'шт.')
+URLS = (
+    '/api/ingredients/',
+    '/api/ingredients/?name=ингредиент 5',
+    '/api/ingredients/?name=ингредиент 5&limit=20',
+)
+
+
+def create_ingredients(count):
+    for batch_start in range(0, count, BATCH_SIZE):
+        Ingredient.objects.bulk_create(
+            Ingredient(
+                name=f'ингредиент {i // len(UNITS)}',
+                measurement_unit=UNITS[i % len(UNITS)]
+            )
+            for i in range(batch_start, min(batch_start + BATCH_SIZE, count))
+        )
+
+
+def explain():
+    queryset = Ingredient.objects.all()
+    sql, params = queryset.query.sql_with_params()
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        return '; '.join(' '.join(map(str, row)) for row in cursor.fetchall())
+
+
+def report(client, repeat, title):
+    print(title)
+    print(f'  plan: {explain()}')
+    for url in URLS:
+        print(f'  {url:<50}{measure(lambda: client.get(url), repeat):>10.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    client = APIClient()
+    with test_database(), override_settings(CATALOG_CACHE_ENABLED=False):
+        create_ingredients(args.size)
+        report(client, args.repeat, 'with the unique index, ms')
+        # SQLite rebuilds the table from the model without the constraint.
+        constraints = Ingredient._meta.constraints
+        Ingredient._meta.constraints = []
+        try:
+            with connection.schema_editor() as schema_editor:
+                schema_editor.remove_constraint(Ingredient, constraints[0])
+            report(client, args.repeat, 'without the index, ms')
+        finally:
+            Ingredient._meta.constraints = constraints
+
+
+if __name__ == '__main__':
+    main()
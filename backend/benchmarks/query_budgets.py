@@ -0,0 +1,209 @@
+'''
+Request the views with the SQL query budgets on the synthetic dataset
+of benchmarks.seed with the budgets enforced, report the queries over
+the budget with their stacks, the queries depending on the page size
+and the queries made more than once by a request. The lists and the
+admin changelists are requested with pages of 1 and 20 rows.
+
+Run from the backend directory, the exit code is 1 on failures:
+python -m benchmarks.query_budgets
+'''
+import argparse
+import os
+import sys
+from contextlib import contextmanager, nullcontext
+from functools import partial
+from unittest import mock
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.contrib import admin  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from django.urls import resolve  # noqa: E402
+from rest_framework.authtoken.models import Token  # noqa: E402
+from rest_framework.pagination import PageNumberPagination  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from backend.query_budget import (  # noqa: E402
+    QUERY_BUDGET_ENFORCE, QUERY_BUDGETS, QueryBudgetExceeded, QueryLog,
+    get_view_name
+)
+from benchmarks.seed import SCALES, seed  # noqa: E402
+from benchmarks.utils import test_database  # noqa: E402
+from recipe.admin import CHANGELIST_QUERY_BUDGETS  # noqa: E402
+from recipe.models import (  # noqa: E402
+    Favorite, Follow, FoodgramUser, Ingredient, Recipe, Tag
+)
+
+# The paginated views are requested with the page sizes, the number
+# of the queries must be the same.
+PAGE_SIZES = (1, 20)
+# Enough tags for the full pages of the tag changelist.
+SCALE = dict(SCALES['small'], tags=max(PAGE_SIZES))
+# The urls with the paginated views, {limit} is the page size.
+API_URLS = (
+    ('/api/recipes/', True),
+    ('/api/recipes/?tags={tag}&is_favorited=1', True),
+    ('/api/recipes/{recipe}/', False),
+    ('/api/recipes/download_shopping_cart/', False),
+    ('/api/users/', True),
+    ('/api/users/{author}/', False),
+    ('/api/users/me/', False),
+    ('/api/users/subscriptions/?recipes_limit={limit}', True),
+    ('/api/tags/', False),
+    ('/api/tags/{tag_id}/', False),
+    ('/api/ingredients/?name=ингредиент 1', False),
+    ('/api/ingredients/{ingredient}/', False),
+)
+ADMIN_URLS = tuple(
+    (f'/admin/{model._meta.app_label}/{model._meta.model_name}/', model)
+    for model in CHANGELIST_QUERY_BUDGETS
+)
+
+
+@contextmanager
+def api_page_size(size):
+    # The paginations read PAGE_SIZE once, on import.
+    with mock.patch.object(PageNumberPagination, 'page_size', size):
+        yield
+
+
+@contextmanager
+def admin_page_size(model, size):
+    with mock.patch.object(admin.site._registry[model], 'list_per_page', size):
+        yield
+
+
+def get_rows(response):
+    '''The number of the rows on the page of the list or the changelist.'''
+    if response.context_data is not None:
+        return len(response.context_data['cl'].result_list)
+    return len(response.data['results'])
+
+
+def request(client, url):
+    '''The queries of the request, the budget error and the response.'''
+    query_log = QueryLog()
+    error = response = None
+    with connection.execute_wrapper(query_log):
+        try:
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+        except QueryBudgetExceeded as exceeded:
+            error = str(exceeded)
+    return query_log, error, response
+
+
+def check(client, url, values, verbose, page_size=None):
+    '''
+    Print the queries of the url, return the number of the failures.
+    page_size patches the page size of the view, the pages must be full.
+    '''
+    name = get_view_name(
+        resolve(url.format(limit=1, **values).split('?')[0]), 'GET'
+    )
+    counts = []
+    failures = 0
+    # The catalogs are loaded by the first request.
+    request(client, url.format(limit=1, **values))
+    for limit in PAGE_SIZES if page_size else (None,):
+        with page_size(limit) if page_size else nullcontext():
+            query_log, error, response = request(
+                client, url.format(limit=limit, **values)
+            )
+        counts.append(len(query_log))
+        if error:
+            failures += 1
+            print(error)
+            continue
+        if verbose:
+            for shape, count in query_log.get_duplicates():
+                print(f'  {count} x {shape}')
+        if page_size and get_rows(response) != limit:
+            failures += 1
+            print(f'  The page of {limit} has {get_rows(response)} rows.')
+    budget = QUERY_BUDGETS.get(name)
+    print(f'{name:<40}{"/".join(map(str, counts)):>8}{str(budget):>6}  {url}')
+    if len(set(counts)) > 1:
+        failures += 1
+        print(f'  The queries depend on the page size: {counts}.')
+    return failures, name
+
+
+def fill_pages(user, tag):
+    '''The user follows and favors enough for the full pages.'''
+    size = max(PAGE_SIZES)
+    for author in FoodgramUser.objects.exclude(pk=user.pk).order_by(
+        '-recipes_count'
+    )[:size]:
+        Follow.objects.get_or_create(user=user, author=author)
+    for recipe in Recipe.objects.filter(tags=tag).order_by('pk')[:size]:
+        Favorite.objects.get_or_create(user=user, recipe=recipe)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        '--verbose', action='store_true',
+        help='Print the duplicated queries of every request.'
+    )
+    args = parser.parse_args()
+    failures = 0
+    checked = set()
+    with test_database(), override_settings(
+        QUERY_BUDGET_MODE=QUERY_BUDGET_ENFORCE, RESPONSE_CACHE_ENABLED=False
+    ):
+        seed(SCALE, log=lambda line: None)
+        user = FoodgramUser.objects.order_by('pk').first()
+        user.is_staff = user.is_superuser = True
+        user.save()
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user)}'
+        )
+        tag = Tag.objects.order_by('pk').first()
+        fill_pages(user, tag)
+        values = dict(
+            tag=tag.slug, tag_id=tag.pk,
+            recipe=Recipe.objects.order_by('pk').values_list(
+                'pk', flat=True
+            )[0],
+            author=FoodgramUser.objects.order_by('-recipes_count')[0].pk,
+            ingredient=Ingredient.objects.order_by('pk').values_list(
+                'pk', flat=True
+            )[0],
+        )
+        print(f'{"view":<40}{"queries":>8}{"budget":>6}')
+        for url, paginated in API_URLS:
+            url_failures, name = check(
+                client, url, values, args.verbose,
+                page_size=api_page_size if paginated else None
+            )
+            failures += url_failures
+            checked.add(name)
+        admin_client = APIClient()
+        admin_client.force_login(user)
+        for url, model in ADMIN_URLS:
+            url_failures, name = check(
+                admin_client, url, {}, args.verbose,
+                page_size=partial(admin_page_size, model)
+            )
+            failures += url_failures
+            checked.add(name)
+    for name in sorted(set(QUERY_BUDGETS) - checked):
+        print(f'{name:<40}{"-":>8}{QUERY_BUDGETS[name]:>6}  not requested')
+    if failures:
+        print(f'{failures} views are over the budget.')
+        sys.exit(1)
+    print('All the views are within the budgets.')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+'''
+Latency of the first and the deepest page of the recipe list
+with the page number and the cursor pagination as the table grows.
+
+Run from the backend directory:
+python -m benchmarks.recipe_pagination --sizes 10000 100000 1000000
+'''
+import argparse
+import os
+from base64 import b64encode
+from urllib.parse import urlencode
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from rest_framework.test import APIClient  # noqa: E402
+
+from benchmarks.utils import (  # noqa: E402
+    create_recipes, measure, test_database
+)
+from recipe.models import Recipe  # noqa: E402
+
+
+def make_cursor(recipe):
+    return b64encode(
+        urlencode({'p': str(recipe.pub_date)}).encode('ascii')
+    ).decode('ascii')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[10000, 100000]
+    )
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    page_size = settings.REST_FRAMEWORK['PAGE_SIZE']
+    client = APIClient()
+    print(
+        f'{"recipes":>10}{"page 1":>10}{"last page":>11}'
+        f'{"approx. count":>15}{"cursor 1":>10}{"cursor last":>13}'
+    )
+    with test_database():
+        created = 0
+        for size in sorted(args.sizes):
+            create_recipes(size - created, start=created)
+            created = size
+            last_page = (size - 1) // page_size + 1
+            last_recipe = Recipe.objects.order_by('pub_date', 'id')[
+                page_size
+            ]
+            timings = [
+                measure(lambda: client.get(url), args.repeat) for url in (
+                    '/api/recipes/',
+                    f'/api/recipes/?page={last_page}',
+                    f'/api/recipes/?page={last_page}&count=approximate',
+                    '/api/recipes/?pagination=cursor',
+                    '/api/recipes/?pagination=cursor&cursor='
+                    f'{make_cursor(last_recipe)}',
+                )
+            ]
+            print(f'{size:>10}' + ''.join(
+                f'{timing:>{width}.1f}'
+                for timing, width in zip(timings, (10, 11, 15, 10, 13))
+            ))
+
+
+if __name__ == '__main__':
+    main()
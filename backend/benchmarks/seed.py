@@ -0,0 +1,245 @@
+'''
+Fill the database with a deterministic synthetic dataset: users, tags,
+ingredients, recipes with products and tags, favorites, shopping carts
+and follows. The same seed and scale always give the same rows.
+
+Run from the backend directory to fill the configured database,
+an empty SQLite file or a local PostgreSQL:
+python -m benchmarks.seed --scale large
+python -m benchmarks.seed --users 10000 --recipes 1000000
+'''
+import argparse
+import os
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from django.contrib.auth.hashers import make_password  # noqa: E402
+from django.db import transaction  # noqa: E402
+
+from benchmarks.utils import BATCH_SIZE  # noqa: E402
+from recipe.catalog import CATALOGS  # noqa: E402
+from recipe.counters import COUNTERS, get_live_counters  # noqa: E402
+from recipe.models import (  # noqa: E402
+    Favorite, Follow, FoodgramUser, Ingredient, Product, Recipe,
+    ShoppingCart, ShoppingListItem, Tag
+)
+from recipe.shopping_lists import get_live_amounts  # noqa: E402
+from recipe.versions import (  # noqa: E402
+    RECIPES_VERSION_NAME, bump_versions
+)
+
+SEED = 2024
+# The password of every generated user.
+PASSWORD = 'benchmark'
+# The publication date of the newest recipe, the others are older.
+NEWEST_PUB_DATE = datetime(2024, 1, 1, tzinfo=timezone.utc)
+UNITS = ('г', 'кг', 'мл', 'л', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+SCALES = {
+    'small': dict(
+        users=100, recipes=2000, ingredients=500, tags=5,
+        favorites=20, carts=5, follows=10
+    ),
+    'medium': dict(
+        users=1000, recipes=50000, ingredients=2000, tags=10,
+        favorites=50, carts=10, follows=20
+    ),
+    'large': dict(
+        users=10000, recipes=1000000, ingredients=2000, tags=20,
+        favorites=100, carts=10, follows=30
+    ),
+}
+PRODUCTS_PER_RECIPE = (3, 10)
+TAGS_PER_RECIPE = (1, 3)
+
+
+def batches(rows, size=BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def insert(model, rows):
+    '''Bulk insert the generated rows batch by batch.'''
+    for batch in batches(rows):
+        model.objects.bulk_create(batch, batch_size=len(batch))
+
+
+def get_author(rng, users):
+    '''A few authors write most of the recipes, like on a real site.'''
+    return min(int(rng.expovariate(10 / users)), users - 1)
+
+
+def create_users(count):
+    password = make_password(PASSWORD)
+    insert(FoodgramUser, (
+        FoodgramUser(
+            username=f'user{i}', email=f'user{i}@example.com',
+            first_name='Пользователь', last_name=str(i), password=password
+        )
+        for i in range(count)
+    ))
+    return list(
+        FoodgramUser.objects.order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def create_tags(count):
+    Tag.objects.bulk_create(
+        Tag(name=f'Тэг {i}', color=f'#{i:06X}', slug=f'tag{i}')
+        for i in range(count)
+    )
+    return list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+
+
+def create_ingredients(count):
+    insert(Ingredient, (
+        Ingredient(
+            name=f'ингредиент {i // len(UNITS)}',
+            measurement_unit=UNITS[i % len(UNITS)]
+        )
+        for i in range(count)
+    ))
+    return list(
+        Ingredient.objects.order_by('pk').values_list('pk', flat=True)
+    )
+
+
+def create_recipes(rng, count, user_ids):
+    # auto_now_add is switched off to keep the publication dates fixed.
+    pub_date_field = Recipe._meta.get_field('pub_date')
+    pub_date_field.auto_now_add = False
+    try:
+        insert(Recipe, (
+            Recipe(
+                author_id=user_ids[get_author(rng, len(user_ids))],
+                name=f'Рецепт {i}', image='api/images/temp.png',
+                text=f'Описание рецепта {i}.',
+                cooking_time=rng.randint(1, 180),
+                pub_date=NEWEST_PUB_DATE - timedelta(minutes=i),
+            )
+            for i in range(count)
+        ))
+    finally:
+        pub_date_field.auto_now_add = True
+    return list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+
+
+def create_recipe_relations(rng, recipe_ids, tag_ids, ingredient_ids):
+    insert(Product, (
+        Product(recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=rng.randint(1, 500))
+        for recipe_id in recipe_ids
+        for ingredient_id in rng.sample(
+            ingredient_ids, rng.randint(*PRODUCTS_PER_RECIPE)
+        )
+    ))
+    insert(Recipe.tags.through, (
+        Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+        for recipe_id in recipe_ids
+        for tag_id in rng.sample(tag_ids, rng.randint(*TAGS_PER_RECIPE))
+    ))
+
+
+def create_user_relations(rng, user_ids, recipe_ids, scale):
+    for model, per_user in (
+        (Favorite, scale['favorites']), (ShoppingCart, scale['carts'])
+    ):
+        insert(model, (
+            model(user_id=user_id, recipe_id=recipe_id)
+            for user_id in user_ids
+            for recipe_id in rng.sample(recipe_ids, per_user)
+        ))
+    # The popular authors are followed more often.
+    insert(Follow, (
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id in user_ids
+        for author_id in {
+            user_ids[get_author(rng, len(user_ids))]
+            for _ in range(scale['follows'])
+        } - {user_id}
+    ))
+
+
+def seed(scale, random_seed=SEED, log=print):
+    '''
+    Insert the dataset of the scale, a dictionary of the row counts,
+    and return the ids of the users and the recipes.
+    '''
+    rng = random.Random(random_seed)
+    started = time.perf_counter()
+
+    def done(title):
+        log(f'{title} in {time.perf_counter() - started:.1f} s.')
+
+    with transaction.atomic():
+        user_ids = create_users(scale['users'])
+        tag_ids = create_tags(scale['tags'])
+        ingredient_ids = create_ingredients(scale['ingredients'])
+        done(f'{len(user_ids)} users, {len(tag_ids)} tags, '
+             f'{len(ingredient_ids)} ingredients')
+        recipe_ids = create_recipes(rng, scale['recipes'], user_ids)
+        create_recipe_relations(rng, recipe_ids, tag_ids, ingredient_ids)
+        done(f'{len(recipe_ids)} recipes with products and tags')
+        create_user_relations(rng, user_ids, recipe_ids, scale)
+        done('Favorites, shopping carts and follows')
+        # The rows were inserted in bulk, without the signals.
+        for model in COUNTERS:
+            model.objects.update(**get_live_counters(model))
+        insert(ShoppingListItem, (
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=amount
+            )
+            for (user_id, ingredient_id), amount
+            in get_live_amounts().items()
+        ))
+        done('Counters and shopping lists')
+        for catalog in CATALOGS.values():
+            catalog.invalidate()
+        bump_versions(
+            [RECIPES_VERSION_NAME]
+            + [catalog.name for catalog in CATALOGS.values()]
+        )
+    return user_ids, recipe_ids
+
+
+def add_scale_arguments(parser):
+    parser.add_argument('--scale', choices=SCALES, default='small')
+    for name in SCALES['small']:
+        parser.add_argument(
+            f'--{name}', type=int,
+            help=f'Override the number of {name} of the scale.'
+        )
+    parser.add_argument('--seed', type=int, default=SEED)
+
+
+def get_scale(args):
+    return {
+        name: getattr(args, name) if getattr(args, name) is not None
+        else count
+        for name, count in SCALES[args.scale].items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter
+    )
+    add_scale_arguments(parser)
+    args = parser.parse_args()
+    if Recipe.objects.exists() or FoodgramUser.objects.exists():
+        parser.error('The database is not empty.')
+    seed(get_scale(args), args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+'''
+Time and peak memory of every shopping list format for a large cart.
+
+Run from the backend directory:
+python -m benchmarks.shopping_cart_renderers --recipes 500
+'''
+import argparse
+import os
+import random
+import time
+import tracemalloc
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+django.setup()
+
+from api.report_generator import (  # noqa: E402
+    SHOPPING_CART_RENDERERS, ShoppingList
+)
+
+INGREDIENTS = 2000
+PRODUCTS_PER_RECIPE = 10
+UNITS = ('г', 'мл', 'шт.', 'ст. л.')
+
+
+def make_products(recipes, seed=0):
+    '''Product rows of the cart ordered by ingredient, as the view reads.'''
+    rng = random.Random(seed)
+    products = [
+        (
+            ingredient,
+            f'ингредиент {ingredient}',
+            UNITS[ingredient % len(UNITS)],
+            rng.randint(1, 500),
+            f'Рецепт {recipe}',
+        )
+        for recipe in range(recipes)
+        for ingredient in rng.sample(range(INGREDIENTS), PRODUCTS_PER_RECIPE)
+    ]
+    return sorted(products, key=lambda product: product[1])
+
+
+def measure(renderer_class, products):
+    tracemalloc.start()
+    started = time.perf_counter()
+    size = 0
+    for chunk in renderer_class().render(ShoppingList(iter(products))):
+        size += len(chunk)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--recipes', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+    products = make_products(args.recipes)
+    print(f'{args.recipes} recipes, {len(products)} product rows')
+    print(f'{"format":<8}{"time, ms":>12}{"peak, KiB":>12}{"size, KiB":>12}')
+    for format, renderer_class in SHOPPING_CART_RENDERERS.items():
+        elapsed, peak, size = min(
+            measure(renderer_class, products) for _ in range(args.repeat)
+        )
+        print(
+            f'{format:<8}{elapsed * 1000:>12.1f}'
+            f'{peak / 1024:>12.1f}{size / 1024:>12.1f}'
+        )
+
+
+if __name__ == '__main__':
+    main()
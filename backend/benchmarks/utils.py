@@ -0,0 +1,67 @@
+import statistics
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import connection
+from django.test.utils import (
+    setup_test_environment, teardown_test_environment
+)
+from django.utils import timezone
+
+from recipe.models import FoodgramUser, Recipe
+
+BATCH_SIZE = 10000
+
+
+@contextmanager
+def test_database():
+    '''A throwaway database with the migrations applied.'''
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat=5):
+    '''Return the median time of the calls in milliseconds.'''
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings) * 1000
+
+
+def create_recipes(count, start=0, authors=10):
+    '''
+    Insert the recipes in batches, one second apart from each other,
+    auto_now_add is switched off to keep the publication dates distinct.
+    '''
+    users = list(FoodgramUser.objects.all()[:authors])
+    for i in range(len(users), authors):
+        users.append(FoodgramUser.objects.create(
+            username=f'author{i}', email=f'author{i}@example.com',
+            first_name='Автор', last_name=str(i)
+        ))
+    pub_date_field = Recipe._meta.get_field('pub_date')
+    pub_date_field.auto_now_add = False
+    now = timezone.now()
+    try:
+        for batch_start in range(start, start + count, BATCH_SIZE):
+            Recipe.objects.bulk_create(
+                Recipe(
+                    author=users[i % authors], name=f'Рецепт {i}',
+                    image='api/images/temp.png', text='Описание',
+                    cooking_time=i % 120 + 1,
+                    pub_date=now - timedelta(seconds=i),
+                )
+                for i in range(
+                    batch_start, min(batch_start + BATCH_SIZE, start + count)
+                )
+            )
+    finally:
+        pub_date_field.auto_now_add = True
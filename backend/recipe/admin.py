@@ -3,15 +3,28 @@ from collections import defaultdict
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
-from django.db.models import Value, Case, When, CharField
+from django.db.models import Value, Case, When, CharField, Count, Prefetch
 from django.utils.safestring import mark_safe
 
+from backend.query_budget import set_query_budget
 from recipe.models import (
     FoodgramUser, Follow, Tag, Recipe, Favorite, Product,
-    ShoppingCart, Ingredient
+    ShoppingCart, ShoppingListItem, Ingredient
 )
 
 BOUNDARY_VALUES = (15, 45)
+# The SQL queries of the changelists with the session and the user.
+CHANGELIST_QUERY_BUDGETS = {
+    Recipe: 9,
+    FoodgramUser: 5,
+    Ingredient: 6,
+    Follow: 5,
+    Tag: 5,
+    Favorite: 5,
+    Product: 5,
+    ShoppingCart: 5,
+    ShoppingListItem: 5,
+}
 
 
 class RecipesOrFollowersFilter(admin.SimpleListFilter):
@@ -27,9 +40,9 @@ class RecipesOrFollowersFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'favorite_recipes':
-            return queryset.filter(favorites__isnull=False)
+            return queryset.filter(favorites_count__gt=0)
         if self.value() == 'followers':
-            return queryset.filter(authors__isnull=False)
+            return queryset.filter(followers_count__gt=0)
 
 
 class CookingTimeFilter(admin.SimpleListFilter):
@@ -51,13 +64,6 @@ class CookingTimeFilter(admin.SimpleListFilter):
             output_field=CharField(),
         ))
 
-    @staticmethod
-    def get_bin(time):
-        for el in BOUNDARY_VALUES:
-            if el >= time:
-                return str(el)
-        return 'inf'
-
     @staticmethod
     def format_time_message(left, rigth, count):
         if left == '0':
@@ -67,10 +73,11 @@ class CookingTimeFilter(admin.SimpleListFilter):
         return f'От {left} минут до {rigth} минут ({count})'
 
     def lookups(self, request, model_admin):
-        chart_data = defaultdict(int)
-        for recipe in Recipe.objects.all():
-            bin = self.get_bin(recipe.cooking_time)
-            chart_data[bin] += 1
+        chart_data = defaultdict(int, self.calculate_chart_data().values(
+            'time_slice'
+        ).annotate(count=Count('pk')).order_by().values_list(
+            'time_slice', 'count'
+        ))
 
         filter_messages = dict()
         left_time = '0'
@@ -105,28 +112,17 @@ class CookingTimeFilter(admin.SimpleListFilter):
 class FoodgramUserAdmin(UserAdmin):
     list_display = (
         'username', 'email', 'first_name', 'last_name', 'recipes_count',
-        'favorite_recipes_count', 'followers_count'
+        'favorites_count', 'followers_count'
     )
     list_filter = (RecipesOrFollowersFilter,)
     search_fields = ('username', 'first_name', 'last_name')
 
-    @admin.display(description='Рецепты')
-    def recipes_count(self, user):
-        return user.recipes.count()
-
-    @admin.display(description='Подписчиков')
-    def favorite_recipes_count(self, user):
-        return user.favorites.count()
-
-    @admin.display(description='Подписок')
-    def followers_count(self, user):
-        return user.authors.count()
-
 
 @admin.register(Follow)
 class FollowAdmin(admin.ModelAdmin):
-    pass
     list_display = ('user', 'author')
+    list_select_related = ('user', 'author')
+    ordering = ('user', 'author')
 
 
 @admin.register(Tag)
@@ -148,26 +144,44 @@ class ProductAdmin(admin.ModelAdmin):
     list_filter = ('measurement_unit',)
     search_fields = ('name', 'measurement_unit')
 
-    @admin.display(description='Рецепты')
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=Count('products__recipe', distinct=True)
+        )
+
+    @admin.display(description='Рецепты', ordering='recipes_count')
     def recipes_count(self, ingredient):
-        return Recipe.objects.filter(products__ingredient=ingredient).count()
+        return ingredient.recipes_count
 
 
 class ProductInLine(admin.TabularInline):
     model = Product
+    # A select of all the ingredients in every row is a query per row.
+    autocomplete_fields = ('ingredient',)
 
 
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = (
-        'name', 'username', 'cooking_time', 'preview_image',
-        'preview_ingredients', 'preview_tags'
+        'name', 'username', 'cooking_time', 'favorites_count',
+        'preview_image', 'preview_ingredients', 'preview_tags'
     )
     list_filter = ('tags', CookingTimeFilter)
     search_fields = ('name', 'tags__name')
-    fields = 'author', 'name', 'image', 'text', 'tags', 'cooking_time'
+    fields = (
+        'author', 'name', 'image', 'text', 'tags', 'cooking_time',
+        'favorites_count'
+    )
+    readonly_fields = ('favorites_count',)
     inlines = [ProductInLine, ]
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related('tags', Prefetch(
+            'products', Product.objects.select_related('ingredient')
+        ))
+
     def author_username(self, obj):
         return obj.username
 
@@ -204,16 +218,44 @@ class RecipeAdmin(admin.ModelAdmin):
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    ordering = ('user', 'recipe')
 
 
 @admin.register(Product)
 class IngredientAdmin(admin.ModelAdmin):
     list_display = ('recipe', 'ingredient', 'amount')
+    list_select_related = ('recipe', 'ingredient')
+    ordering = ('recipe', 'ingredient')
 
 
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+    list_select_related = ('user', 'recipe')
+    ordering = ('user', 'recipe')
+
+
+@admin.register(ShoppingListItem)
+class ShoppingListItemAdmin(admin.ModelAdmin):
+    '''The shopping lists are kept by the signals of the carts, read only.'''
+
+    list_display = ('user', 'ingredient', 'amount')
+    list_select_related = ('user', 'ingredient')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 
 admin.site.unregister(Group)
+for model, queries in CHANGELIST_QUERY_BUDGETS.items():
+    set_query_budget(
+        f'admin:{model._meta.app_label}_{model._meta.model_name}_changelist',
+        queries
+    )
@@ -0,0 +1,67 @@
+from threading import Lock
+
+from recipe.models import Ingredient, Tag
+from recipe.search import IngredientIndex
+from recipe.versions import get_version
+
+
+class CatalogSnapshot:
+    '''The table rows loaded for one version of the table.'''
+
+    def __init__(self, version, objects, index_class=None):
+        self.version = version
+        self.objects = objects
+        self.by_pk = {str(obj.pk): obj for obj in objects}
+        self.index = index_class(objects) if index_class else None
+
+
+class Catalog:
+    '''
+    A copy of a reference table kept in the memory of the worker,
+    reloaded when another worker changes the version of the table.
+    '''
+
+    def __init__(self, model, index_class=None):
+        self.model = model
+        self.index_class = index_class
+        self.name = model._meta.label_lower
+        self.snapshot = None
+        self.lock = Lock()
+
+    def get_snapshot(self):
+        version = get_version(self.name)
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.version != version:
+            with self.lock:
+                snapshot = self.snapshot
+                if snapshot is None or snapshot.version != version:
+                    snapshot = self.snapshot = CatalogSnapshot(
+                        version, tuple(self.model.objects.all()),
+                        self.index_class
+                    )
+        return snapshot
+
+    def all(self):
+        return self.get_snapshot().objects
+
+    def get(self, pk):
+        return self.get_snapshot().by_pk.get(str(pk))
+
+    @property
+    def index(self):
+        return self.get_snapshot().index
+
+    def invalidate(self):
+        self.snapshot = None
+
+    def __deepcopy__(self, memo):
+        # The catalog is shared by the worker, serializer fields
+        # holding it are deep-copied per serializer instance.
+        return self
+
+
+tag_catalog = Catalog(Tag)
+ingredient_catalog = Catalog(Ingredient, index_class=IngredientIndex)
+CATALOGS = {
+    catalog.model: catalog for catalog in (tag_catalog, ingredient_catalog)
+}
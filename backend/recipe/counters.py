@@ -0,0 +1,52 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from recipe.models import (
+    Favorite, Follow, FoodgramUser, Recipe, ShoppingCart
+)
+
+# The counter fields of the models: the counted model and its relation.
+COUNTERS = {
+    FoodgramUser: {
+        'recipes_count': (Recipe, 'author'),
+        'followers_count': (Follow, 'author'),
+        'favorites_count': (Favorite, 'user'),
+    },
+    Recipe: {
+        'favorites_count': (Favorite, 'recipe'),
+        'in_carts_count': (ShoppingCart, 'recipe'),
+    },
+}
+# The counters changed by the rows of the counted models.
+COUNTED = defaultdict(list)
+for counter_model, counters in COUNTERS.items():
+    for counter, (counted_model, relation) in counters.items():
+        COUNTED[counted_model].append((relation, counter_model, counter))
+
+
+def change_counters(instance, delta):
+    '''Add the delta to the counters of the objects the row refers to.'''
+    for relation, counter_model, counter in COUNTED[type(instance)]:
+        pk = getattr(instance, instance._meta.get_field(relation).attname)
+        if pk is not None:
+            # A drifted counter stays at zero instead of failing
+            # the check of the positive field.
+            counter_model.objects.filter(pk=pk).update(
+                **{counter: Greatest(F(counter) + delta, 0)}
+            )
+
+
+def get_live_counters(model):
+    '''Return the expressions counting the rows of every counter field.'''
+    return {
+        counter: Coalesce(Subquery(
+            counted_model.objects.filter(
+                **{relation: OuterRef('pk')}
+            ).order_by().values(relation).annotate(
+                count=Count('pk')
+            ).values('count')
+        ), 0)
+        for counter, (counted_model, relation) in COUNTERS[model].items()
+    }
@@ -0,0 +1,132 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+from recipe.models import Recipe
+from recipe.versions import bump_recipe_versions
+
+logger = logging.getLogger(__name__)
+
+# The name of the variant: the longest side, the format and the extension.
+IMAGE_VARIANTS = {
+    'thumbnail': (320, 'JPEG', 'jpg'),
+    'medium': (960, 'JPEG', 'jpg'),
+    'thumbnail_webp': (320, 'WEBP', 'webp'),
+    'medium_webp': (960, 'WEBP', 'webp'),
+}
+IMAGE_QUALITY = 80
+IMAGE_BACKGROUND = (255, 255, 255)
+VARIANT_FILENAME = '{stem}_{variant}.{extension}'
+
+executor = None
+executor_lock = Lock()
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        with executor_lock:
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=settings.IMAGE_PIPELINE_WORKERS,
+                    thread_name_prefix='image-pipeline'
+                )
+    return executor
+
+
+def resize(image, size, format):
+    '''Return the image fitted into the square of the size in the format.'''
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+    if format == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGBA')
+        background = Image.new('RGB', variant.size, IMAGE_BACKGROUND)
+        background.paste(variant, mask=variant.getchannel('A'))
+        variant = background
+    buffer = BytesIO()
+    variant.save(buffer, format, quality=IMAGE_QUALITY, optimize=True)
+    return buffer.getvalue()
+
+
+def get_variant_stem(image_name):
+    return os.path.splitext(image_name)[0]
+
+
+def has_outdated_variants(recipe):
+    '''
+    The image of the recipe is new or its variants are missing
+    or made from another image.
+    '''
+    if not recipe.image:
+        return False
+    if not recipe.image._committed or not recipe.image_variants:
+        return True
+    stem = get_variant_stem(recipe.image.name)
+    return any(
+        not path.startswith(f'{stem}_')
+        for path in recipe.image_variants.values()
+    )
+
+
+def make_image_variants(recipe_id, image_name):
+    '''
+    Save the variants of the recipe image next to it, the names are
+    stored only if the recipe still has the same image.
+    '''
+    largest = max(size for size, _, _ in IMAGE_VARIANTS.values())
+    stem = get_variant_stem(image_name)
+    variants = {}
+    with default_storage.open(image_name) as file, Image.open(file) as image:
+        # JPEG images are decoded already reduced close to the size.
+        image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        for name, (size, format, extension) in IMAGE_VARIANTS.items():
+            path = VARIANT_FILENAME.format(
+                stem=stem, variant=name, extension=extension
+            )
+            # Making the variants again replaces the files.
+            default_storage.delete(path)
+            variants[name] = default_storage.save(
+                path, ContentFile(resize(image, size, format))
+            )
+    if Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_variants=variants
+    ):
+        bump_recipe_versions([recipe_id])
+        return variants
+    for path in variants.values():
+        default_storage.delete(path)
+    return None
+
+
+def run_in_worker(recipe_id, image_name):
+    try:
+        make_image_variants(recipe_id, image_name)
+    except Exception:
+        logger.exception(
+            'Variants of the image %s of the recipe %s are not made.',
+            image_name, recipe_id
+        )
+    finally:
+        connection.close()
+
+
+def process_image(recipe):
+    '''Make the variants of the image after the transaction is committed.'''
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    if not settings.IMAGE_PIPELINE_WORKERS:
+        transaction.on_commit(
+            lambda: make_image_variants(recipe_id, image_name)
+        )
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(run_in_worker, recipe_id, image_name)
+    )
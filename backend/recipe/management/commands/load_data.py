@@ -0,0 +1,219 @@
+import csv
+import json
+import time
+from io import StringIO
+from itertools import islice
+from pathlib import Path
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from recipe.catalog import CATALOGS
+from recipe.models import Ingredient, Tag
+from recipe.versions import bump_version
+
+BATCH_SIZE = 10000
+JSON_CHUNK_SIZE = 64 * 1024
+# The loaded fields and the sets of fields unique together of the models.
+MODELS = {
+    'ingredient': (
+        Ingredient, ('name', 'measurement_unit'),
+        (('name', 'measurement_unit'),)
+    ),
+    'tag': (
+        Tag, ('name', 'color', 'slug'), (('name',), ('color',), ('slug',))
+    ),
+}
+# The tables of the files by the file names without the extension.
+FILE_MODELS = {
+    'ingredients': 'ingredient',
+    'tags': 'tag',
+}
+
+
+def iter_json_array(file):
+    '''Read the items of the JSON array one by one from the file.'''
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if not started and buffer[position:position + 1] == '[':
+            started = True
+            position += 1
+            continue
+        if buffer[position:position + 1] == ']':
+            return
+        if started and position < len(buffer):
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError as error:
+                # The item cut by the end of the file is not an invalid one.
+                if eof and (
+                    error.pos >= len(buffer)
+                    or error.msg.startswith('Unterminated')
+                ):
+                    raise CommandError(
+                        'Unexpected end of file in the JSON array.'
+                    )
+                if eof:
+                    raise CommandError(f'Invalid JSON: {error}.')
+            else:
+                yield item
+                continue
+        elif eof:
+            raise CommandError(
+                'Unexpected end of file in the JSON array.' if started
+                else 'The JSON file is not an array.'
+            )
+        chunk = file.read(JSON_CHUNK_SIZE)
+        eof = not chunk
+        buffer = buffer[position:] + chunk
+        position = 0
+
+
+def read_rows(path, fields):
+    '''Yield the dictionaries of the fields from the CSV or JSON file.'''
+    with open(path, encoding='utf-8', newline='') as file:
+        if path.suffix == '.csv':
+            for row in csv.reader(file):
+                yield dict(zip(fields, row))
+            return
+        for item in iter_json_array(file):
+            # Django fixtures keep the values under fields.
+            yield item.get('fields', item)
+
+
+class Command(BaseCommand):
+    help = (
+        'Load the ingredients or the tags from CSV or JSON files, '
+        'the rows already in the database are skipped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', type=Path)
+        parser.add_argument(
+            '--model', choices=MODELS,
+            help='The loaded table, by default taken from the file name: '
+                 f'{", ".join(FILE_MODELS)}.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        for path in options['paths']:
+            name = options['model'] or FILE_MODELS.get(path.stem)
+            if name is None:
+                raise CommandError(
+                    f'Unknown table of the file {path}, set it with --model.'
+                )
+            if path.suffix not in ('.csv', '.json'):
+                raise CommandError(f'Unknown format of the file {path}.')
+            self.load(path, *MODELS[name], options['batch_size'])
+
+    @staticmethod
+    def clean_value(value, validators):
+        '''Return the stripped text checked by the validators of the field.'''
+        value = str(value or '').strip()
+        if not value:
+            raise ValidationError('The value is empty.')
+        for validator in validators:
+            validator(value)
+        return value
+
+    def clean_rows(self, rows, model, fields, unique_fields, stats):
+        '''Skip the invalid rows and the rows with the known unique values.'''
+        validators = [
+            model._meta.get_field(field).validators for field in fields
+        ]
+        seen = [
+            set(model.objects.values_list(*unique).iterator())
+            for unique in unique_fields
+        ]
+        for row in rows:
+            stats['read'] += 1
+            try:
+                values = tuple(
+                    self.clean_value(row.get(field), field_validators)
+                    for field, field_validators in zip(fields, validators)
+                )
+            except ValidationError:
+                stats['invalid'] += 1
+                continue
+            keys = [
+                tuple(values[fields.index(field)] for field in unique)
+                for unique in unique_fields
+            ]
+            if any(key in keys_seen for key, keys_seen in zip(keys, seen)):
+                stats['duplicates'] += 1
+                continue
+            for key, keys_seen in zip(keys, seen):
+                keys_seen.add(key)
+            yield values
+
+    def load(self, path, model, fields, unique_fields, batch_size):
+        started = time.perf_counter()
+        stats = dict.fromkeys(('read', 'invalid', 'duplicates'), 0)
+        insert = (
+            self.copy_batch if connection.vendor == 'postgresql'
+            else self.create_batch
+        )
+        with transaction.atomic():
+            count = model.objects.count()
+            rows = self.clean_rows(
+                read_rows(path, fields), model, fields, unique_fields, stats
+            )
+            while True:
+                batch = list(islice(rows, batch_size))
+                if not batch:
+                    break
+                insert(model, fields, batch)
+            inserted = model.objects.count() - count
+            catalog = CATALOGS[model]
+            catalog.invalidate()
+            bump_version(catalog.name)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{path}: {stats["read"]} rows read, {inserted} inserted, '
+            f'{stats["duplicates"]} duplicates, {stats["invalid"]} invalid '
+            f'in {elapsed:.2f} s, {stats["read"] / elapsed:.0f} rows/s.'
+        ))
+
+    @staticmethod
+    def create_batch(model, fields, batch):
+        model.objects.bulk_create(
+            (model(**dict(zip(fields, values))) for values in batch),
+            batch_size=len(batch), ignore_conflicts=True
+        )
+
+    @staticmethod
+    def copy_batch(model, fields, batch):
+        '''
+        COPY the rows into a temporary table and move them into the table
+        skipping the rows added by concurrent requests in the meantime.
+        '''
+        data = StringIO()
+        csv.writer(data).writerows(batch)
+        data.seek(0)
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(
+            connection.ops.quote_name(model._meta.get_field(field).column)
+            for field in fields
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE load_data AS '
+                f'SELECT {columns} FROM {table} WITH NO DATA'
+            )
+            cursor.copy_expert(
+                f'COPY load_data ({columns}) FROM STDIN WITH (FORMAT csv)',
+                data
+            )
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT {columns} FROM load_data ON CONFLICT DO NOTHING'
+            )
+            cursor.execute('DROP TABLE load_data')
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from recipe.images import make_image_variants
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Make the resized copies of the recipe images without them, '
+        'with --all of every recipe image.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Make the copies again for all the recipes.'
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='')
+        if not options['all']:
+            recipes = recipes.filter(image_variants={})
+        made = failed = 0
+        for recipe_id, image_name in recipes.values_list(
+            'pk', 'image'
+        ).iterator():
+            try:
+                make_image_variants(recipe_id, image_name)
+            except OSError as error:
+                failed += 1
+                self.stderr.write(f'{image_name}: {error}')
+            else:
+                made += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Made the images of {made} recipes, {failed} failed.'
+        ))
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipe.models import ShoppingListItem
+from recipe.shopping_lists import get_live_amounts
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild the shopping lists from the shopping carts, '
+        'with --check only report the differences.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Compare the shopping lists with the shopping carts.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            live = get_live_amounts()
+            stored = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount
+                in ShoppingListItem.objects.values_list(
+                    'user_id', 'ingredient_id', 'amount'
+                ).iterator()
+            }
+            differences = [
+                (key, stored.get(key), live.get(key))
+                for key in live.keys() | stored.keys()
+                if stored.get(key) != live.get(key)
+            ]
+            if options['check']:
+                for (user_id, ingredient_id), old, new in differences:
+                    self.stdout.write(
+                        f'user {user_id}, ingredient {ingredient_id}: '
+                        f'stored {old}, expected {new}'
+                    )
+                if differences:
+                    raise CommandError(
+                        f'{len(differences)} shopping list items differ.'
+                    )
+                self.stdout.write(self.style.SUCCESS(
+                    f'{len(stored)} shopping list items are correct.'
+                ))
+                return
+            ShoppingListItem.objects.all().delete()
+            ShoppingListItem.objects.bulk_create(
+                ShoppingListItem(
+                    user_id=user_id, ingredient_id=ingredient_id,
+                    amount=amount
+                )
+                for (user_id, ingredient_id), amount in live.items()
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {len(live)} shopping list items, '
+            f'{len(differences)} were wrong.'
+        ))
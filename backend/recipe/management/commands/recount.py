@@ -0,0 +1,57 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Q
+
+from recipe.counters import COUNTERS, get_live_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Recount the counters of the users and the recipes, '
+        'with --check only report the differences.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Compare the counters with the counted rows.'
+        )
+
+    def handle(self, *args, **options):
+        differences = 0
+        with transaction.atomic():
+            for model in COUNTERS:
+                live = get_live_counters(model)
+                wrong = model.objects.annotate(**{
+                    f'live_{counter}': expression
+                    for counter, expression in live.items()
+                }).filter(reduce(or_, (
+                    ~Q(**{counter: F(f'live_{counter}')}) for counter in live
+                ))).order_by()
+                if options['check']:
+                    for row in wrong.values(
+                        'pk', *live, *(f'live_{counter}' for counter in live)
+                    ):
+                        self.stdout.write(
+                            f'{model._meta.model_name} {row["pk"]}: '
+                            + ', '.join(
+                                f'{counter} {row[counter]}, expected '
+                                f'{row[f"live_{counter}"]}'
+                                for counter in live
+                            )
+                        )
+                        differences += 1
+                    continue
+                differences += wrong.count()
+                model.objects.update(**live)
+        if options['check']:
+            if differences:
+                raise CommandError(f'{differences} rows have wrong counters.')
+            self.stdout.write(self.style.SUCCESS('The counters are correct.'))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Recounted the counters, {differences} rows were wrong.'
+        ))
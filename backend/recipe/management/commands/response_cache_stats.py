@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from api.response_cache import get_counters, reset_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Show the hits and misses of the anonymous recipe responses cache '
+        'counted by the workers with METRICS_ENABLED, with --reset start '
+        'counting again.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset', action='store_true', help='Reset the counters.'
+        )
+
+    def handle(self, *args, **options):
+        counters = get_counters()
+        total = counters['hits'] + counters['misses']
+        ratio = counters['hits'] / total if total else 0
+        self.stdout.write(
+            f'hits {counters["hits"]}, misses {counters["misses"]}, '
+            f'hit ratio {ratio:.1%}'
+        )
+        if options['reset']:
+            reset_counters()
+            self.stdout.write(self.style.SUCCESS('The counters are reset.'))
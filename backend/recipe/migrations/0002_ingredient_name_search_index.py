@@ -0,0 +1,19 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:08
+
+from django.db import migrations, models
+import django.db.models.functions.text
+import recipe.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(recipe.models.PortableOpClass(django.db.models.functions.text.Upper('name'), name='text_pattern_ops'), name='ingredient_name_upper_idx'),
+        ),
+    ]
@@ -0,0 +1,67 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:26
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_rows(model, owner, kept_id, ingredient_ids):
+    '''
+    Leave one row of the kept ingredient per owner
+    with the sum of the amounts of the merged ingredients.
+    '''
+    rows = model.objects.filter(ingredient_id__in=ingredient_ids)
+    kept_rows = list(rows.values(owner).annotate(
+        row_id=Min('pk'), total=Sum('amount')
+    ).order_by())
+    # The other rows are deleted first, otherwise the kept row would
+    # collide with the row of the owner already having the kept ingredient.
+    rows.exclude(pk__in=[row['row_id'] for row in kept_rows]).delete()
+    for row in kept_rows:
+        model.objects.filter(pk=row['row_id']).update(
+            ingredient_id=kept_id, amount=row['total']
+        )
+
+
+def merge_duplicate_ingredients(apps, schema_editor):
+    '''Merge the ingredients with the same name and measurement unit.'''
+    Ingredient = apps.get_model('recipe', 'Ingredient')
+    Product = apps.get_model('recipe', 'Product')
+    ShoppingListItem = apps.get_model('recipe', 'ShoppingListItem')
+    duplicates = Ingredient.objects.values(
+        'name', 'measurement_unit'
+    ).annotate(
+        kept_id=Min('pk'), count=Count('pk')
+    ).filter(count__gt=1).order_by()
+    for duplicate in list(duplicates):
+        ingredient_ids = list(Ingredient.objects.filter(
+            name=duplicate['name'],
+            measurement_unit=duplicate['measurement_unit']
+        ).values_list('pk', flat=True))
+        merge_rows(Product, 'recipe_id', duplicate['kept_id'], ingredient_ids)
+        merge_rows(
+            ShoppingListItem, 'user_id', duplicate['kept_id'], ingredient_ids
+        )
+        Ingredient.objects.filter(pk__in=ingredient_ids).exclude(
+            pk=duplicate['kept_id']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+    # The merge commits in its own transaction, PostgreSQL refuses to alter
+    # the table while the checks of the deferred foreign keys are pending.
+    atomic = False
+
+    dependencies = [
+        ('recipe', '0005_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            merge_duplicate_ingredients, migrations.RunPython.noop,
+            atomic=True
+        ),
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('name', 'measurement_unit'), name='unique_ingredient_name_measurement_unit'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.3 on 2026-10-18 14:10
+
+from django.db import migrations
+
+OLD_INDEX_NAME = 'recipe_ingredient_name_upper_idx'
+INDEX_NAME = 'ingredient_name_upper_idx'
+
+
+def rename_name_search_index(apps, schema_editor):
+    '''
+    The databases migrated before the index was declared by the model
+    have it under the name given by the raw SQL of the former 0002.
+    '''
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        f'ALTER INDEX IF EXISTS {OLD_INDEX_NAME} RENAME TO {INDEX_NAME}'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipe', '0008_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            rename_name_search_index, migrations.RunPython.noop
+        ),
+    ]
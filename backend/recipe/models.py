@@ -1,6 +1,11 @@
+from copy import deepcopy
+
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres import indexes
 from django.core.validators import MinValueValidator, RegexValidator
 from django.db import models
+from django.db.models.expressions import Col
+from django.db.models.functions import Upper
 
 from recipe.validators import validate_username
 
@@ -10,6 +15,31 @@ CHARFIELD_MAX_LENGTH = 200
 COLOR_MAX_LENGTH = 7
 
 
+class PortableOpClass(indexes.OpClass):
+    '''
+    The operator class of PostgreSQL, SQLite of the tests indexes the bare
+    expression. The tables remade by SQLite qualify the columns of the
+    expression, which SQLite does not allow in an index.
+    '''
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        expression = deepcopy(self.get_source_expressions()[0])
+        for node in expression.flatten():
+            if isinstance(node, Col):
+                node.alias = None
+        return compiler.compile(expression)
+
+
+class LoadedValuesMixin:
+    '''Keeps the values of the fields read from the database.'''
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.loaded_values = dict(zip(field_names, values))
+        return instance
+
+
 class FoodgramUser(AbstractUser):
 
     email = models.EmailField(
@@ -24,6 +54,15 @@ class FoodgramUser(AbstractUser):
         validators=[validate_username]
     )
     password = models.CharField('Пароль', max_length=USER_CHARFIELD_MAX_LENGTH)
+    recipes_count = models.PositiveIntegerField(
+        'Рецептов', default=0, editable=False
+    )
+    followers_count = models.PositiveIntegerField(
+        'Подписчиков', default=0, editable=False
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ['first_name', 'last_name', 'username']
@@ -39,9 +78,10 @@ class FoodgramUser(AbstractUser):
 
 class Follow(models.Model):
 
+    # The index of the unique constraint starts with the user.
     user = models.ForeignKey(
         FoodgramUser, on_delete=models.CASCADE, related_name='users',
-        verbose_name='Подписчик'
+        verbose_name='Подписчик', db_index=False
     )
     author = models.ForeignKey(
         FoodgramUser, on_delete=models.SET_NULL, null=True, blank=True,
@@ -57,7 +97,6 @@ class Follow(models.Model):
         ]
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
-        ordering = ('user', 'author')
 
     def __str__(self):
         return f'{self.user.last_name[:30]} {self.user.first_name[:30]}'
@@ -74,6 +113,20 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ('name', 'measurement_unit')
+        # The index of the constraint also serves the ordering.
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient_name_measurement_unit'
+            )
+        ]
+        indexes = [
+            # The istartswith lookup is UPPER(name) LIKE 'X%' on PostgreSQL.
+            models.Index(
+                PortableOpClass(Upper('name'), name='text_pattern_ops'),
+                name='ingredient_name_upper_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name[:30]} {self.measurement_unit[:30]}'
@@ -107,16 +160,21 @@ class Tag(models.Model):
 
 class Recipe(models.Model):
 
+    # The author index is recipe_author_pub_date_id_idx.
     author = models.ForeignKey(
         FoodgramUser,
         on_delete=models.CASCADE,
-        verbose_name='Автор'
+        verbose_name='Автор',
+        db_index=False
     )
     name = models.CharField('Название', max_length=CHARFIELD_MAX_LENGTH)
     image = models.ImageField(
         'Изображение',
         upload_to='api/images/',
     )
+    image_variants = models.JSONField(
+        'Варианты изображения', default=dict, blank=True, editable=False
+    )
     text = models.TextField('Описание')
     tags = models.ManyToManyField(
         Tag,
@@ -129,21 +187,38 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Добавлено'
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном', default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах', default=0, editable=False
+    )
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='recipe_author_pub_date_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name[:30]}'
 
 
-class RecipeSubscribeBase(models.Model):
+class RecipeSubscribeBase(LoadedValuesMixin, models.Model):
 
+    # The index of the unique constraint starts with the user.
     user = models.ForeignKey(
         FoodgramUser, on_delete=models.CASCADE, verbose_name='Пользователь',
+        db_index=False
     )
     recipe = models.ForeignKey(
         Recipe, on_delete=models.CASCADE, verbose_name='Рецепт',
@@ -151,7 +226,6 @@ class RecipeSubscribeBase(models.Model):
 
     class Meta:
         abstract = True
-        ordering = ('user', 'recipe')
         default_related_name = '%(class)ss'
         constraints = [
             models.UniqueConstraint(
@@ -171,16 +245,18 @@ class Favorite(RecipeSubscribeBase):
         verbose_name_plural = 'Подписки на рецепты'
 
 
-class Product(models.Model):
+class Product(LoadedValuesMixin, models.Model):
 
     amount = models.IntegerField(
         'Количество',
         validators=[MinValueValidator(1)]
     )
+    # The recipe index is product_recipe_ingredient_idx.
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
-        verbose_name='Рецепт'
+        verbose_name='Рецепт',
+        db_index=False
     )
     ingredient = models.ForeignKey(
         Ingredient,
@@ -192,7 +268,13 @@ class Product(models.Model):
         verbose_name = 'Продукт'
         verbose_name_plural = 'Продукты'
         default_related_name = 'products'
-        ordering = ('recipe', 'ingredient')
+        indexes = [
+            # Covers the products of the recipes read with the amounts.
+            models.Index(
+                fields=['recipe', 'ingredient'], include=['amount'],
+                name='product_recipe_ingredient_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.ingredient.name[:30]} {self.recipe.name[:30]}'
@@ -203,3 +285,28 @@ class ShoppingCart(RecipeSubscribeBase):
     class Meta(RecipeSubscribeBase.Meta):
         verbose_name = 'Корзина покупок'
         verbose_name_plural = 'Список корзин покупок'
+
+
+class ShoppingListItem(models.Model):
+
+    user = models.ForeignKey(
+        FoodgramUser, on_delete=models.CASCADE, verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, verbose_name='Ингредиент',
+    )
+    amount = models.IntegerField('Количество')
+
+    class Meta:
+        verbose_name = 'Продукт списка покупок'
+        verbose_name_plural = 'Продукты списков покупок'
+        default_related_name = 'shopping_list_items'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_shopping_list_ingredient'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient.name[:30]} {self.amount}'
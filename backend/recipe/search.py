@@ -0,0 +1,49 @@
+from bisect import bisect_left
+from itertools import chain, islice
+
+PREFIX_END = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    '''
+    Search of the ingredients by name over the sorted array
+    of the casefolded names.
+    '''
+
+    def __init__(self, ingredients):
+        self.ingredients = ingredients
+        self.names = [ingredient.name.casefold() for ingredient in ingredients]
+        self.order = sorted(
+            range(len(self.names)), key=self.names.__getitem__
+        )
+        self.keys = [self.names[position] for position in self.order]
+
+    def find_prefix(self, text):
+        '''Return the positions of the names starting with the text.'''
+        return sorted(self.order[
+            bisect_left(self.keys, text):
+            bisect_left(self.keys, text + PREFIX_END)
+        ])
+
+    def find_substring(self, text, exclude):
+        '''Return the positions of the names containing the text.'''
+        return (
+            position for position, name in enumerate(self.names)
+            if text in name and position not in exclude
+        )
+
+    def search(self, text, ranked=False, limit=None):
+        '''
+        Return the ingredients whose name starts with the text,
+        in the ranked mode followed by the ones containing the text.
+        '''
+        text = text.casefold()
+        positions = self.find_prefix(text)
+        if ranked:
+            positions = chain(
+                positions, self.find_substring(text, set(positions))
+            )
+        return [
+            self.ingredients[position]
+            for position in islice(positions, limit)
+        ]
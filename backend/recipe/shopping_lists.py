@@ -0,0 +1,116 @@
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from recipe.models import Product, ShoppingCart, ShoppingListItem
+
+# The recipes whose products are written in bulk, the writer changes
+# the shopping lists once instead of the signals of every row.
+bulk_written_recipes = ContextVar('bulk_written_recipes', default=frozenset())
+
+
+def get_recipe_amounts(recipe_id):
+    '''Return the amounts of the recipe ingredients by ingredient id.'''
+    return Counter(dict(
+        Product.objects.filter(recipe_id=recipe_id).values(
+            'ingredient_id'
+        ).annotate(total=Sum('amount')).order_by().values_list(
+            'ingredient_id', 'total'
+        )
+    ))
+
+
+@contextmanager
+def writing_products_in_bulk(recipe_id):
+    token = bulk_written_recipes.set(
+        bulk_written_recipes.get() | {recipe_id}
+    )
+    try:
+        yield
+    finally:
+        bulk_written_recipes.reset(token)
+
+
+def is_written_in_bulk(product):
+    return product.recipe_id in bulk_written_recipes.get()
+
+
+def get_live_amounts():
+    '''
+    Return the shopping list amounts aggregated from the shopping carts
+    by (user id, ingredient id).
+    '''
+    return {
+        (user_id, ingredient_id): amount
+        for user_id, ingredient_id, amount in ShoppingCart.objects.values(
+            'user_id', 'recipe__products__ingredient_id'
+        ).annotate(
+            amount=Sum('recipe__products__amount')
+        ).filter(amount__isnull=False).order_by().values_list(
+            'user_id', 'recipe__products__ingredient_id', 'amount'
+        )
+    }
+
+
+def apply_shopping_list_changes(user_ids, changes):
+    '''
+    Add the changes of the ingredient amounts
+    to the shopping lists of the users.
+    '''
+    changes = {
+        ingredient_id: change
+        for ingredient_id, change in changes.items() if change
+    }
+    if not changes:
+        return
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    ShoppingListItem.objects.bulk_create(
+        (
+            ShoppingListItem(
+                user_id=user_id, ingredient_id=ingredient_id, amount=0
+            )
+            for user_id in user_ids
+            for ingredient_id, change in changes.items() if change > 0
+        ),
+        ignore_conflicts=True
+    )
+    items = ShoppingListItem.objects.filter(
+        user_id__in=user_ids, ingredient_id__in=changes
+    )
+    items.update(amount=F('amount') + Case(
+        *(
+            When(ingredient_id=ingredient_id, then=Value(change))
+            for ingredient_id, change in changes.items()
+        ),
+        default=Value(0),
+        output_field=IntegerField()
+    ))
+    items.filter(amount__lte=0).delete()
+
+
+def add_recipe_to_shopping_list(user_id, recipe_id):
+    apply_shopping_list_changes([user_id], get_recipe_amounts(recipe_id))
+
+
+def remove_recipe_from_shopping_list(user_id, recipe_id):
+    apply_shopping_list_changes([user_id], {
+        ingredient_id: -amount
+        for ingredient_id, amount in get_recipe_amounts(recipe_id).items()
+    })
+
+
+def change_recipe_in_shopping_lists(recipe_id, changes):
+    '''
+    Apply the changes of the recipe ingredient amounts to the shopping
+    lists of all the users having the recipe in the shopping cart.
+    '''
+    apply_shopping_list_changes(
+        ShoppingCart.objects.filter(recipe_id=recipe_id).values_list(
+            'user_id', flat=True
+        ),
+        changes
+    )
@@ -0,0 +1,229 @@
+from collections import Counter
+
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save
+)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from recipe.catalog import CATALOGS
+from recipe.counters import change_counters
+from recipe.images import has_outdated_variants, process_image
+from recipe.models import (
+    Favorite, Follow, FoodgramUser, Ingredient, Product, Recipe,
+    ShoppingCart, Tag
+)
+from recipe.shopping_lists import (
+    add_recipe_to_shopping_list, change_recipe_in_shopping_lists,
+    is_written_in_bulk, remove_recipe_from_shopping_list
+)
+from recipe.versions import (
+    AUTH_VERSION_NAME, AUTHORS_VERSION_NAME, RECIPES_VERSION_NAME,
+    bump_recipe_versions, bump_version, bump_versions, get_user_version_name
+)
+
+# The fields of the rows compared with the saved rows by the signals.
+SAVED_FIELDS = {
+    Favorite: ('user_id', 'recipe_id'),
+    ShoppingCart: ('user_id', 'recipe_id'),
+    Product: ('recipe_id', 'ingredient_id', 'amount'),
+}
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def change_catalog(sender, **kwargs):
+    '''Reload the catalog of the changed table in all the workers.'''
+    catalog = CATALOGS[sender]
+    catalog.invalidate()
+    bump_version(catalog.name)
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingCart)
+@receiver(pre_save, sender=Product)
+def remember_saved_values(sender, instance, **kwargs):
+    '''
+    Remember the values of the row before the save from the loaded
+    instance, the row is read only for an instance made by hand.
+    '''
+    field_names = SAVED_FIELDS[sender]
+    loaded_values = getattr(instance, 'loaded_values', {})
+    if instance._state.adding:
+        instance.saved_values = None
+    elif all(name in loaded_values for name in field_names):
+        instance.saved_values = {
+            name: loaded_values[name] for name in field_names
+        }
+    else:
+        instance.saved_values = sender.objects.filter(
+            pk=instance.pk
+        ).values(*field_names).first()
+    # The next save of the instance changes the row saved now.
+    instance.loaded_values = {
+        name: getattr(instance, name) for name in field_names
+    }
+
+
+def get_moved_row(instance, relations=('user_id', 'recipe_id')):
+    '''The row before the save when the save changed its relations.'''
+    saved_values = getattr(instance, 'saved_values', None)
+    if saved_values is None or all(
+        saved_values[name] == getattr(instance, name) for name in relations
+    ):
+        return None
+    return type(instance)(pk=instance.pk, **saved_values)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_shopping_list(sender, instance, created, **kwargs):
+    moved_cart = get_moved_row(instance)
+    if moved_cart is not None:
+        remove_recipe_from_shopping_list(
+            moved_cart.user_id, moved_cart.recipe_id
+        )
+    if created or moved_cart is not None:
+        add_recipe_to_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_delete, sender=ShoppingCart)
+def remove_from_shopping_list(sender, instance, **kwargs):
+    '''
+    Subtract the recipe from the shopping list. When the recipe itself
+    is deleted, whichever of its carts and products is deleted first
+    subtracts the amounts, the other finds nothing to subtract.
+    '''
+    remove_recipe_from_shopping_list(instance.user_id, instance.recipe_id)
+
+
+@receiver(post_save, sender=Product)
+def change_product_in_shopping_lists(sender, instance, **kwargs):
+    changes = Counter({instance.ingredient_id: instance.amount})
+    saved_values = instance.saved_values
+    if saved_values is not None:
+        saved_changes = {
+            saved_values['ingredient_id']: -saved_values['amount']
+        }
+        if saved_values['recipe_id'] == instance.recipe_id:
+            changes.update(saved_changes)
+        else:
+            change_recipe_in_shopping_lists(
+                saved_values['recipe_id'], saved_changes
+            )
+    change_recipe_in_shopping_lists(instance.recipe_id, changes)
+
+
+@receiver(post_delete, sender=Product)
+def remove_product_from_shopping_lists(sender, instance, **kwargs):
+    if is_written_in_bulk(instance):
+        return
+    change_recipe_in_shopping_lists(
+        instance.recipe_id, {instance.ingredient_id: -instance.amount}
+    )
+
+
+@receiver(pre_save, sender=Recipe)
+def reset_image_variants(sender, instance, **kwargs):
+    '''The variants of the replaced image are not shown.'''
+    instance.image_outdated = has_outdated_variants(instance)
+    if instance.image_outdated:
+        instance.image_variants = {}
+
+
+@receiver(post_save, sender=Recipe)
+def make_image_variants(sender, instance, **kwargs):
+    if getattr(instance, 'image_outdated', False):
+        process_image(instance)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def change_recipes(sender, instance, **kwargs):
+    '''Change the version of the recipes shown by the API.'''
+    if sender is Recipe:
+        bump_recipe_versions([instance.pk])
+        return
+    if is_written_in_bulk(instance):
+        return
+    recipe_ids = [instance.recipe_id]
+    moved_product = get_moved_row(instance, relations=('recipe_id',))
+    if moved_product is not None:
+        recipe_ids.append(moved_product.recipe_id)
+    bump_recipe_versions(recipe_ids)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def change_recipe_tags(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        recipe_ids = [instance.pk]
+    elif action == 'pre_clear':
+        # The cleared recipes are unknown after the clear.
+        recipe_ids = instance.recipes.values_list('pk', flat=True)
+    else:
+        recipe_ids = pk_set
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        bump_recipe_versions(recipe_ids)
+
+
+@receiver(post_save, sender=FoodgramUser)
+def change_author(sender, instance, created, update_fields, **kwargs):
+    '''
+    The recipes show their authors, a login saving only
+    the time of the last login changes nothing of it.
+    '''
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    # One version of all the authors instead of a version per recipe.
+    if instance.recipes.exists():
+        bump_versions([RECIPES_VERSION_NAME, AUTHORS_VERSION_NAME])
+
+
+@receiver(post_save, sender=FoodgramUser)
+@receiver(post_delete, sender=Token)
+def change_authentication(sender, created=False, update_fields=None,
+                          **kwargs):
+    '''
+    The workers keep the users of the tokens, a logout or a change
+    of a user makes them read the tokens again.
+    '''
+    if created or update_fields == frozenset({'last_login'}):
+        return
+    bump_version(AUTH_VERSION_NAME)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def change_user_flags(sender, instance, **kwargs):
+    '''Change the version of the recipe flags of the user.'''
+    bump_version(get_user_version_name(instance.user_id))
+    moved_row = get_moved_row(instance)
+    if moved_row is not None and moved_row.user_id != instance.user_id:
+        bump_version(get_user_version_name(moved_row.user_id))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+def increment_counters(sender, instance, created, **kwargs):
+    moved_row = get_moved_row(instance)
+    if moved_row is not None:
+        change_counters(moved_row, -1)
+    if created or moved_row is not None:
+        change_counters(instance, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+def decrement_counters(sender, instance, **kwargs):
+    change_counters(instance, -1)
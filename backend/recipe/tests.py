@@ -0,0 +1,226 @@
+import re
+from unittest import mock, skipUnless
+
+from django.contrib import admin
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from backend.query_budget import QUERY_BUDGET_ENFORCE
+from recipe.admin import CHANGELIST_QUERY_BUDGETS
+from recipe.models import (
+    Favorite, Follow, FoodgramUser, Ingredient, Product, Recipe, ShoppingCart,
+    ShoppingListItem, Tag
+)
+from recipe.shopping_lists import get_live_amounts
+
+PAGE_SIZES = (1, 20)
+ROWS = max(PAGE_SIZES)
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+# The tables read by every request, never by a full scan.
+HOT_TABLES = {
+    model._meta.db_table for model in (
+        Recipe, Product, Favorite, ShoppingCart, Follow, ShoppingListItem,
+        Recipe.tags.through
+    )
+}
+
+
+class DatasetTestCase(TestCase):
+    '''Enough rows of every table for the full pages of 20 rows.'''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            FoodgramUser.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                first_name='Пользователь', last_name=str(number),
+                password='password'
+            )
+            for number in range(ROWS + 1)
+        ]
+        cls.admin_user = cls.users[0]
+        cls.admin_user.is_staff = cls.admin_user.is_superuser = True
+        cls.admin_user.save()
+        tags = [
+            Tag.objects.create(
+                name=f'Тэг {number}', color=f'#{number:06X}',
+                slug=f'tag{number}'
+            )
+            for number in range(ROWS)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(ROWS)
+        ]
+        for number in range(ROWS):
+            recipe = Recipe.objects.create(
+                author=cls.users[number + 1], name=f'Рецепт {number}',
+                image='api/images/test.png', text='Описание',
+                cooking_time=number + 1,
+                image_variants={'thumbnail': 'api/images/test_thumbnail.jpg'}
+            )
+            recipe.tags.set(tags[:number % 3 + 1])
+            Product.objects.create(
+                recipe=recipe, ingredient=ingredients[number], amount=10
+            )
+            Favorite.objects.create(user=cls.admin_user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.admin_user, recipe=recipe)
+            Follow.objects.create(
+                user=cls.admin_user, author=cls.users[number + 1]
+            )
+
+
+@override_settings(QUERY_BUDGET_MODE=QUERY_BUDGET_ENFORCE)
+class AdminChangelistQueriesTest(DatasetTestCase):
+    '''The changelists make the same queries for any page size.'''
+
+    def setUp(self):
+        self.client.force_login(self.admin_user)
+
+    def test_changelists(self):
+        for model, queries in CHANGELIST_QUERY_BUDGETS.items():
+            model_admin = admin.site._registry[model]
+            url = f'/admin/{model._meta.app_label}/{model._meta.model_name}/'
+            for page_size in PAGE_SIZES:
+                with self.subTest(
+                    model=model.__name__, page_size=page_size
+                ), mock.patch.object(
+                    model_admin, 'list_per_page', page_size
+                ), self.assertNumQueries(queries):
+                    response = self.client.get(url)
+                    self.assertEqual(
+                        len(response.context_data['cl'].result_list),
+                        page_size
+                    )
+
+
+class ShoppingListSignalsTest(DatasetTestCase):
+    '''The shopping lists follow the carts and the products moved around.'''
+
+    def assertShoppingListsLive(self):
+        self.assertEqual(
+            {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount in (
+                    ShoppingListItem.objects.values_list(
+                        'user', 'ingredient', 'amount'
+                    )
+                )
+            },
+            get_live_amounts()
+        )
+
+    def test_move_cart(self):
+        cart = ShoppingCart.objects.filter(user=self.admin_user).first()
+        cart.user = self.users[1]
+        cart.save()
+        self.assertShoppingListsLive()
+        cart.recipe = Recipe.objects.exclude(pk=cart.recipe_id).first()
+        cart.save()
+        self.assertShoppingListsLive()
+
+    def test_move_product(self):
+        product = Product.objects.first()
+        product.amount += 5
+        # The saved values are taken from the loaded product.
+        with self.assertNumQueries(5) as captured:
+            product.save(update_fields=['amount'])
+        self.assertFalse([
+            query for query in captured.captured_queries
+            if query['sql'].startswith('SELECT "recipe_product"')
+        ])
+        self.assertShoppingListsLive()
+        product.recipe = Recipe.objects.exclude(pk=product.recipe_id).first()
+        product.ingredient = Ingredient.objects.exclude(
+            pk=product.ingredient_id
+        ).first()
+        product.save()
+        self.assertShoppingListsLive()
+
+
+class CounterTest(DatasetTestCase):
+
+    def test_drifted_counter(self):
+        favorite = Favorite.objects.first()
+        Recipe.objects.filter(pk=favorite.recipe_id).update(favorites_count=0)
+        favorite.delete()
+        self.assertEqual(
+            Recipe.objects.get(pk=favorite.recipe_id).favorites_count, 0
+        )
+
+
+@skipUnless(
+    connection.vendor == 'postgresql',
+    'The plans of the indexes are checked on PostgreSQL.'
+)
+class QueryPlanTest(DatasetTestCase):
+    '''
+    The queries of the main endpoints read the hot tables by the indexes.
+    The sequential scans are disabled, so that the planner shows whether
+    an index can serve the query at all on the small test tables.
+    '''
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin_user)
+
+    def get_plans(self, url):
+        '''The plans of the SELECT queries made by the request.'''
+        queries = []
+
+        def execute(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                queries.append((sql, params))
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(execute):
+            self.client.get(url)
+        plans = []
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            for sql, params in queries:
+                cursor.execute(f'EXPLAIN {sql}', params)
+                plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+            cursor.execute('RESET enable_seqscan')
+        return plans
+
+    def test_no_full_scans(self):
+        author = self.users[1]
+        for url in (
+            '/api/recipes/',
+            f'/api/recipes/?author={author.pk}',
+            '/api/recipes/?tags=tag0',
+            '/api/recipes/?is_favorited=1',
+            '/api/recipes/?is_in_shopping_cart=1',
+            '/api/recipes/?pagination=cursor',
+            f'/api/recipes/{author.recipes.get().pk}/',
+            '/api/users/subscriptions/',
+            '/api/recipes/download_shopping_cart/',
+        ):
+            for plan in self.get_plans(url):
+                with self.subTest(url=url):
+                    self.assertFalse(
+                        set(SEQ_SCAN.findall(plan)) & HOT_TABLES, plan
+                    )
+
+    @override_settings(CATALOG_CACHE_ENABLED=False)
+    def test_indexes(self):
+        author = self.users[1]
+        for url, index in (
+            ('/api/recipes/', 'recipe_pub_date_id_idx'),
+            (
+                f'/api/recipes/?author={author.pk}',
+                'recipe_author_pub_date_id_idx'
+            ),
+            (
+                '/api/ingredients/?name=ингр',
+                'ingredient_name_upper_idx'
+            ),
+        ):
+            with self.subTest(url=url):
+                self.assertTrue(
+                    any(index in plan for plan in self.get_plans(url)), url
+                )
@@ -0,0 +1,53 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'version:{name}'
+USER_VERSION_NAME = 'user.{user_id}'
+RECIPES_VERSION_NAME = 'recipe.recipe'
+RECIPE_VERSION_NAME = 'recipe.recipe.{recipe_id}'
+# The names of all the authors shown by the recipes.
+AUTHORS_VERSION_NAME = 'recipe.author'
+AUTH_VERSION_NAME = 'auth'
+
+
+def get_version(name):
+    '''
+    Return the version of the data shared by all the workers,
+    the version is the time of the last change in nanoseconds.
+    '''
+    return cache.get_or_set(VERSION_KEY.format(name=name), time.time_ns, None)
+
+
+def bump_version(name):
+    '''Change the version of the data after the transaction is committed.'''
+    bump_versions([name])
+
+
+def bump_versions(names):
+    '''Change the versions of the data with one cache call.'''
+    keys = [VERSION_KEY.format(name=name) for name in names]
+    if not keys:
+        return
+    transaction.on_commit(
+        lambda: cache.set_many(dict.fromkeys(keys, time.time_ns()), None)
+    )
+
+
+def get_user_version_name(user_id):
+    '''The version of the favorites, shopping cart and subscriptions.'''
+    return USER_VERSION_NAME.format(user_id=user_id)
+
+
+def get_recipe_version_name(recipe_id):
+    '''The version of one recipe, its products, tags and author.'''
+    return RECIPE_VERSION_NAME.format(recipe_id=recipe_id)
+
+
+def bump_recipe_versions(recipe_ids):
+    '''Change the version of all the recipes and of the given ones.'''
+    bump_versions([
+        RECIPES_VERSION_NAME,
+        *(get_recipe_version_name(recipe_id) for recipe_id in recipe_ids)
+    ])